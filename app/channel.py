@@ -0,0 +1,182 @@
+import re
+
+import pandas as pd
+from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+
+from app.crawler import MAX_WORKERS
+from app.quota import QuotaScheduler
+from app.scoring import score_videos
+from app.sentiment_analyzer import SentimentAnalyzer, SENTIMENTS, POLARITY
+from app.youtube_data import API_KEY, DataRetrievalError
+
+# Uploads analyzed per channel or playlist, newest first
+MAX_VIDEOS = 50
+# Largest page the playlistItems endpoint serves
+PLAYLIST_PAGE_SIZE = 50
+
+CHANNEL_ID_PATTERN = re.compile(r'^UC[\w-]{22}$')
+PLAYLIST_ID_PATTERN = re.compile(r'^(PL|UU|OL|FL)[\w-]{10,}$')
+HANDLE_PATTERN = re.compile(r'^@[\w.-]+$')
+CHANNEL_URL_PATTERN = re.compile(r'youtube\.com/(?:channel/(UC[\w-]{22})|(@[\w.-]+)|user/([\w.-]+)|c/([\w.-]+))')
+PLAYLIST_URL_PATTERN = re.compile(r'youtube\.com/playlist\?(?:.*&)?list=([\w-]+)')
+
+
+def parse_channel_url(url):
+    """
+    :param url: Channel or playlist URL, channel ID, @handle or playlist ID
+    :return: tuple: kind ('channel', 'handle', 'username', 'custom' or 'playlist') & its value,
+        None when the URL points to neither
+    """
+    url = url.strip()
+    if CHANNEL_ID_PATTERN.match(url):
+        return 'channel', url
+    if HANDLE_PATTERN.match(url):
+        return 'handle', url
+    if PLAYLIST_ID_PATTERN.match(url):
+        return 'playlist', url
+    match = PLAYLIST_URL_PATTERN.search(url)
+    if match:
+        return 'playlist', match.group(1)
+    match = CHANNEL_URL_PATTERN.search(url)
+    if match:
+        channel_id, handle, username, custom = match.groups()
+        if channel_id:
+            return 'channel', channel_id
+        if handle:
+            return 'handle', handle
+        return ('username', username) if username else ('custom', custom)
+    return None
+
+
+class ChannelUploads:
+
+    def __init__(self, url, scheduler=None):
+        """
+        :param url: Channel or playlist URL, channel ID, @handle or playlist ID
+        :param scheduler: Optional QuotaScheduler every API request goes through
+        """
+        source = parse_channel_url(url)
+        if source is None:
+            raise DataRetrievalError("Invalid URL. Please enter a valid YouTube channel or playlist URL.")
+        self.kind, self.source_id = source
+        # The API resolves IDs, handles & legacy usernames, but not custom (/c/) URLs
+        if self.kind == 'custom':
+            raise DataRetrievalError("Custom channel URLs (youtube.com/c/...) can't be looked up. "
+                                     "Please enter the channel's @handle or youtube.com/channel/UC... URL.")
+        self.youtube = build('youtube', 'v3', developerKey=API_KEY)
+        self.scheduler = scheduler
+
+    def _execute(self, request):
+        if self.scheduler is None:
+            return request.execute()
+        return self.scheduler.execute(request, key=self.source_id)
+
+    def get_playlist_id(self):
+        """
+        :return: ID of the playlist to read: the channel's uploads playlist for a channel
+        """
+        if self.kind == 'playlist':
+            return self.source_id
+
+        params = {'part': 'contentDetails', 'fields': 'items(contentDetails(relatedPlaylists(uploads)))'}
+        if self.kind == 'channel':
+            params['id'] = self.source_id
+        elif self.kind == 'handle':
+            params['forHandle'] = self.source_id
+        else:
+            params['forUsername'] = self.source_id
+        response = self._execute(self.youtube.channels().list(**params))
+        if not response.get('items'):
+            raise DataRetrievalError("Channel not found.")
+        return response['items'][0]['contentDetails']['relatedPlaylists']['uploads']
+
+    def get_video_ids(self, max_videos=MAX_VIDEOS):
+        """
+        :param max_videos: Most videos returned
+        :return: list of video IDs, in playlist order (newest first for uploads)
+        """
+        try:
+            params = {
+                'part': 'contentDetails',
+                'playlistId': self.get_playlist_id(),
+                'fields': 'nextPageToken,items(contentDetails(videoId))',
+            }
+            video_ids = []
+            while len(video_ids) < max_videos:
+                params['maxResults'] = min(PLAYLIST_PAGE_SIZE, max_videos - len(video_ids))
+                response = self._execute(self.youtube.playlistItems().list(**params))
+                video_ids.extend(item['contentDetails']['videoId'] for item in response.get('items', []))
+                if 'nextPageToken' not in response:
+                    break
+                params['pageToken'] = response['nextPageToken']
+        except HttpError as ex:
+            if ex.resp.status == 404:
+                raise DataRetrievalError("Playlist not found.")
+            raise DataRetrievalError("An unexpected error occurred. Please try your request again.")
+
+        if not video_ids:
+            raise DataRetrievalError("No videos found for this channel or playlist.")
+        return video_ids
+
+
+def video_aggregates(comments_df, results):
+    """
+    Per video sentiment of scored comments, for side by side comparison.
+
+    :param comments_df: Scored comments of many videos, with a 'video_id' column
+    :param results: Crawl results of the videos (see crawl_video)
+    :return: Dataframe indexed by video ID, in results order: 'title', 'comments', per
+        sentiment counts & shares ('Positive_share', ...) and the 'weighted_sentiment',
+        the mean polarity (-1 to 1) of the comments weighted by their likes + 1
+    """
+    video_ids = comments_df['video_id']
+    counts = (comments_df.groupby(['video_id', 'analysis'], observed=True).size()
+              .unstack(fill_value=0)
+              .reindex(columns=SENTIMENTS, fill_value=0))
+    weights = comments_df['likes'] + 1
+    weighted_polarity = comments_df['analysis'].astype(object).map(POLARITY) * weights
+
+    titles = {result['video_id']: result['info']['video_name'] for result in results if result['status'] == 'ok'}
+    videos_df = pd.DataFrame({'title': titles})
+    videos_df['comments'] = counts.sum(axis=1)
+    videos_df = videos_df.join(counts).join(counts.div(counts.sum(axis=1), axis=0).add_suffix('_share'))
+    videos_df['weighted_sentiment'] = (weighted_polarity.groupby(video_ids, observed=True).sum()
+                                       / weights.groupby(video_ids, observed=True).sum())
+    videos_df[['comments'] + SENTIMENTS] = videos_df[['comments'] + SENTIMENTS].fillna(0).astype(int)
+    return videos_df
+
+
+def analyze_channel(url, max_videos=MAX_VIDEOS, analyzer=None, comment_store=None, scheduler=None,
+                    max_workers=MAX_WORKERS):
+    """
+    Fetch the latest uploads of a channel (or the videos of a playlist) in
+    parallel and score them in one shared inference pass. Videos fresh in
+    the comment store are not fetched again, and their stored rows are not
+    scored again.
+
+    :param url: Channel or playlist URL, channel ID, @handle or playlist ID
+    :param max_videos: Most videos analyzed
+    :param analyzer: SentimentAnalyzer, a default one when None
+    :param comment_store: Optional CommentStore to read & fill
+    :param scheduler: QuotaScheduler of the whole analysis, a default budget is used when None
+    :param max_workers: Videos fetched at the same time
+    :return: tuple: comments & replies dataframes (with a 'video_id' column), per video
+        aggregates (see video_aggregates), crawl results, stats dict with the channel-wide
+        'sentiment' counts & 'weighted_sentiment'
+    """
+    scheduler = scheduler or QuotaScheduler()
+    video_ids = ChannelUploads(url, scheduler).get_video_ids(max_videos)
+    comments_df, replies_df, results, stats = score_videos(
+        video_ids, analyzer or SentimentAnalyzer(), comment_store=comment_store, scheduler=scheduler,
+        max_workers=max_workers)
+    if comments_df.empty:
+        raise DataRetrievalError("Unable to retrieve comments for any video of this channel or playlist.")
+
+    videos_df = video_aggregates(comments_df, results)
+    stats['sentiment'] = {sentiment: int(count) for sentiment, count in videos_df[SENTIMENTS].sum().items()}
+    weights = comments_df['likes'] + 1
+    stats['weighted_sentiment'] = round(
+        float((comments_df['analysis'].astype(object).map(POLARITY) * weights).sum() / weights.sum()), 3)
+    stats['api_units'] = scheduler.used
+    return comments_df, replies_df, videos_df, results, stats
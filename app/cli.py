@@ -0,0 +1,84 @@
+"""
+Headless fetch & score, for cron jobs and workers (no Streamlit import):
+
+    python -m app.cli URL_OR_ID [...] --output comments.parquet
+    python -m app.cli --ids-file ids.txt --output comments.jsonl --replies-output replies.jsonl
+    python -m app.cli URL_OR_ID --output comments.csv --threads-output threads.csv
+    python -m app.cli --comments-file comments.csv --output scored.csv
+    python -m app.cli --channel https://www.youtube.com/@handle --output comments.parquet --videos-output videos.csv
+"""
+import argparse
+import json
+import logging
+
+from app.channel import analyze_channel, MAX_VIDEOS
+from app.comment_store import CommentStore
+from app.crawler import MAX_WORKERS
+from app.metrics import collect
+from app.quota import QuotaScheduler
+from app.scoring import score_comments_file, score_videos, write_table, TABLE_FORMATS
+from app.sentiment_analyzer import SentimentAnalyzer, thread_aggregates
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score the sentiment of YouTube comments.")
+    parser.add_argument('urls', nargs='*', help="YouTube video URLs or IDs")
+    parser.add_argument('--ids-file', help="File with one video URL or ID per line")
+    parser.add_argument('--channel', help="Channel or playlist URL, channel ID or @handle to score the uploads of")
+    parser.add_argument('--max-videos', type=int, default=MAX_VIDEOS, help="Latest uploads scored with --channel")
+    parser.add_argument('--videos-output', help="Per video sentiment file of --channel")
+    parser.add_argument('--comments-file', help=f"Score an existing comments file ({', '.join(TABLE_FORMATS)})")
+    parser.add_argument('--output', required=True, help=f"Scored comments file ({', '.join(TABLE_FORMATS)})")
+    parser.add_argument('--replies-output', help="Replies file of the fetched videos")
+    parser.add_argument('--threads-output', help="Per-thread reply sentiment file of the fetched videos")
+    parser.add_argument('--backend', help="Inference backend, defaults to SENTIMENT_BACKEND")
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS, help="Videos fetched at the same time")
+    parser.add_argument('--budget', type=int, help="API units the run may spend")
+    parser.add_argument('--no-cache', action='store_true', help="Don't read or fill the comment store")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    analyzer = SentimentAnalyzer(args.backend)
+
+    with collect('cli', output=args.output):
+        if args.comments_file:
+            comments_df, stats = score_comments_file(args.comments_file, analyzer)
+        elif args.channel:
+            scheduler = QuotaScheduler() if args.budget is None else QuotaScheduler(budget=args.budget)
+            comment_store = None if args.no_cache else CommentStore()
+            comments_df, replies_df, videos_df, results, stats = analyze_channel(
+                args.channel, args.max_videos, analyzer, comment_store=comment_store, scheduler=scheduler,
+                max_workers=args.workers)
+            for result in results:
+                if result['status'] != 'ok':
+                    logging.warning("%s: %s", result['input'], result['error'])
+            if args.replies_output:
+                write_table(replies_df, args.replies_output)
+            if args.videos_output:
+                write_table(videos_df.rename_axis('video_id').reset_index(), args.videos_output)
+        else:
+            urls = list(args.urls)
+            if args.ids_file:
+                with open(args.ids_file) as handle:
+                    urls.extend(line.strip() for line in handle if line.strip())
+            if not urls:
+                parser.error("pass video URLs/IDs, --ids-file, --channel or --comments-file")
+
+            scheduler = QuotaScheduler() if args.budget is None else QuotaScheduler(budget=args.budget)
+            comment_store = None if args.no_cache else CommentStore()
+            comments_df, replies_df, results, stats = score_videos(
+                urls, analyzer, comment_store=comment_store, scheduler=scheduler, max_workers=args.workers)
+            for result in results:
+                if result['status'] != 'ok':
+                    logging.warning("%s: %s", result['input'], result['error'])
+            if args.replies_output:
+                write_table(replies_df, args.replies_output)
+            if args.threads_output and not comments_df.empty:
+                write_table(thread_aggregates(comments_df, replies_df), args.threads_output)
+
+        write_table(comments_df, args.output)
+        print(json.dumps(stats))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,271 @@
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from app.metrics import incr
+from app.youtube_data import STRING_DTYPE
+
+CACHE_DIR = os.environ.get(
+    "COMMENT_CACHE_DIR", os.path.join(os.path.dirname(__file__), '../.cache/comments'))
+CACHE_TTL = int(os.environ.get("COMMENT_CACHE_TTL", 6 * 60 * 60))
+MAX_MEMORY_ENTRIES = int(os.environ.get("COMMENT_CACHE_MEMORY_ENTRIES", 32))
+MAX_DISK_ENTRIES = int(os.environ.get("COMMENT_CACHE_DISK_ENTRIES", 512))
+
+logger = logging.getLogger(__name__)
+
+
+def _read_parquet(path):
+    # Strings come back Arrow-backed, like YouTubeData builds them
+    return pq.read_table(path).to_pandas(types_mapper={pa.string(): STRING_DTYPE}.get)
+
+
+def merge_pages(pages):
+    """
+    Merge pages of comments & replies into a single pair of dataframes.
+    On duplicate IDs the last page wins, i.e. stored rows that may already
+    carry an analysis.
+
+    :param pages: iterable of (comments dataframe, replies dataframe)
+    :return: tuple: comments & replies dataframes
+    """
+    pages = list(pages)
+    comments_df = pd.concat([page[0] for page in pages], ignore_index=True)
+    replies_df = pd.concat([page[1] for page in pages], ignore_index=True)
+    return (comments_df.drop_duplicates(subset='id', keep='last', ignore_index=True),
+            replies_df.drop_duplicates(subset='id', keep='last', ignore_index=True))
+
+
+class CommentStore:
+    """
+    Caches the comments & replies dataframes of a video by its ID, so every
+    video is fetched from the YouTube API once per TTL.
+
+    Entries live in an in-process LRU and are persisted to disk as Parquet
+    (one directory per video), so repeat analyses survive restarts and are
+    shared between workers using the same cache directory.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, ttl=CACHE_TTL, max_memory_entries=MAX_MEMORY_ENTRIES,
+                 max_disk_entries=MAX_DISK_ENTRIES):
+        """
+        :param cache_dir: Directory for the Parquet files, None to disable the disk layer
+        :param ttl: Seconds an entry stays fresh
+        :param max_memory_entries: Max videos kept in memory
+        :param max_disk_entries: Max videos kept on disk
+        """
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+
+    def get_dataframes(self, youtube_data, incremental=True):
+        """
+        Return the cached dataframes for the video, fetching them on a miss.
+
+        With incremental sync an expired entry is not thrown away: only the
+        threads newer than the stored ones are fetched and merged into it.
+        Stored rows keep their 'analysis' column, so only the new rows are
+        left to be scored.
+
+        :param youtube_data: YouTubeData instance of the video
+        :param incremental: Sync expired entries instead of re-crawling them
+        :return: tuple: comments & replies dataframes
+        """
+        comments_df, replies_df = merge_pages(self.iter_pages(youtube_data, incremental))
+        self.put(youtube_data.video_id, comments_df, replies_df)
+        return comments_df.copy(), replies_df.copy()
+
+    def iter_pages(self, youtube_data, incremental=True):
+        """
+        Yield the dataframes of the video as they become available: a single
+        page for a fresh entry, the new pages then the stored rows for an
+        incremental sync, or every page of a full crawl. Nothing is stored;
+        the caller puts the merged pages back once it is done with them.
+
+        :param youtube_data: YouTubeData instance of the video
+        :param incremental: Sync expired entries instead of re-crawling them
+        :return: generator of (comments dataframe, replies dataframe)
+        """
+        cached = self.get(youtube_data.video_id)
+        if cached is not None:
+            yield cached
+            return
+
+        stale = self._lookup(youtube_data.video_id) if incremental else None
+        if stale is None:
+            yield from youtube_data.iter_pages()
+            return
+
+        state = self.sync_state(stale[1])
+        new_comments, new_replies = 0, 0
+        for comments_df, replies_df in youtube_data.iter_pages(
+                known_ids=state['known_ids'], newer_than=state['published_at']):
+            new_comments += len(comments_df.index)
+            new_replies += len(replies_df.index)
+            yield comments_df, replies_df
+        logger.info("Synced %s: %d new comments, %d new replies", youtube_data.video_id, new_comments, new_replies)
+        yield stale[1].copy(), stale[2].copy()
+
+    def get(self, video_id):
+        """
+        :param video_id: YouTube video ID
+        :return: tuple of comments & replies dataframes, None when missing or expired
+        """
+        entry = self._lookup(video_id)
+        with self._lock:
+            if entry is None or not self._is_fresh(entry[0]):
+                self._counters['misses'] += 1
+                incr('store_misses')
+                return None
+            self._counters['hits'] += 1
+        incr('store_hits')
+        return entry[1].copy(), entry[2].copy()
+
+    def is_fresh(self, video_id):
+        """
+        :param video_id: YouTube video ID
+        :return: bool: whether iter_pages would serve the stored entry without syncing
+        """
+        entry = self._lookup(video_id)
+        return entry is not None and self._is_fresh(entry[0])
+
+    @staticmethod
+    def sync_state(comments_df):
+        """
+        :param comments_df: Stored comments dataframe
+        :return: dict with the newest 'published_at' and the set of 'known_ids'
+        """
+        return {
+            'published_at': comments_df['timestamp'].max() if len(comments_df.index) else None,
+            'known_ids': set(comments_df['id']),
+        }
+
+    def put(self, video_id, comments_df, replies_df):
+        """
+        Store the dataframes of a video in memory and on disk.
+
+        :param video_id: YouTube video ID
+        :param comments_df: Comments dataframe
+        :param replies_df: Replies dataframe
+        """
+        entry = (time.time(), comments_df.copy(), replies_df.copy())
+        with self._lock:
+            self._remember(video_id, entry)
+        self._write_disk(video_id, entry)
+
+    def stats(self):
+        """
+        :return: dict of hit/miss/eviction counters and current entry counts
+        """
+        with self._lock:
+            return dict(self._counters, memory_entries=len(self._entries))
+
+    def _is_fresh(self, fetched_at):
+        return time.time() - fetched_at < self.ttl
+
+    def _lookup(self, video_id):
+        """
+        :return: (fetched_at, comments_df, replies_df) from memory or disk, fresh or not
+        """
+        with self._lock:
+            entry = self._entries.get(video_id)
+            if entry is not None:
+                self._entries.move_to_end(video_id)
+                return entry
+
+        entry = self._read_disk(video_id)
+        if entry is not None:
+            with self._lock:
+                self._counters['disk_hits'] += 1
+                self._remember(video_id, entry)
+        return entry
+
+    def _remember(self, video_id, entry):
+        # Caller holds the lock
+        self._entries[video_id] = entry
+        self._entries.move_to_end(video_id)
+        while len(self._entries) > self.max_memory_entries:
+            self._entries.popitem(last=False)
+            self._counters['evictions'] += 1
+
+    def _entry_dir(self, video_id):
+        return os.path.join(self.cache_dir, video_id)
+
+    def _read_disk(self, video_id):
+        if not self.cache_dir:
+            return None
+        entry_dir = self._entry_dir(video_id)
+        meta_path = os.path.join(entry_dir, 'meta.json')
+        try:
+            with open(meta_path) as handle:
+                fetched_at = json.load(handle)['fetched_at']
+            comments_df = _read_parquet(os.path.join(entry_dir, 'comments.parquet'))
+            replies_df = _read_parquet(os.path.join(entry_dir, 'replies.parquet'))
+            # Touch the metadata so disk eviction follows last access
+            os.utime(meta_path)
+        except (OSError, ValueError, KeyError):
+            return None
+        return fetched_at, comments_df, replies_df
+
+    def _write_disk(self, video_id, entry):
+        if not self.cache_dir:
+            return
+        fetched_at, comments_df, replies_df = entry
+        entry_dir = self._entry_dir(video_id)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Written aside then swapped in, readers never see a half-written entry
+            temp_dir = tempfile.mkdtemp(prefix=f'.{video_id}.', dir=self.cache_dir)
+            old_dir = None
+            try:
+                comments_df.to_parquet(os.path.join(temp_dir, 'comments.parquet'), index=False)
+                replies_df.to_parquet(os.path.join(temp_dir, 'replies.parquet'), index=False)
+                with open(os.path.join(temp_dir, 'meta.json'), 'w') as handle:
+                    json.dump({'video_id': video_id, 'fetched_at': fetched_at}, handle)
+                # A directory can't replace a non-empty one, move the old entry out of the way first
+                old_dir = tempfile.mkdtemp(prefix=f'.{video_id}.', dir=self.cache_dir)
+                try:
+                    os.replace(entry_dir, old_dir)
+                except FileNotFoundError:
+                    pass
+                try:
+                    os.replace(temp_dir, entry_dir)
+                except OSError:
+                    # Another writer stored the video in between, its copy is as fresh
+                    if not os.path.isdir(entry_dir):
+                        raise
+            finally:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+                if old_dir:
+                    shutil.rmtree(old_dir, ignore_errors=True)
+            self._evict_disk()
+        except (OSError, ValueError) as ex:
+            logger.warning("Unable to persist comments for %s: %s", video_id, ex)
+
+    def _evict_disk(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            # Entries being written or replaced
+            if name.startswith('.'):
+                continue
+            meta_path = os.path.join(self.cache_dir, name, 'meta.json')
+            if os.path.exists(meta_path):
+                entries.append((os.path.getmtime(meta_path), name))
+
+        entries.sort()
+        for _, name in entries[:max(0, len(entries) - self.max_disk_entries)]:
+            shutil.rmtree(os.path.join(self.cache_dir, name), ignore_errors=True)
+            with self._lock:
+                self._counters['evictions'] += 1
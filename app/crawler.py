@@ -0,0 +1,84 @@
+import argparse
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.metrics import propagate
+from app.quota import QuotaScheduler
+from app.youtube_data import YouTubeData, extract_video_id, DataRetrievalError
+
+MAX_WORKERS = 4
+
+logger = logging.getLogger(__name__)
+
+
+def crawl_video(url, scheduler, comment_store=None):
+    """
+    Fetch the details, comments & replies of a single video.
+
+    :param url: YouTube video URL or ID
+    :param scheduler: QuotaScheduler shared by the batch
+    :param comment_store: Optional CommentStore to read & fill
+    :return: dict with the 'status' of the crawl, its results or its 'error',
+        the 'elapsed' time in seconds and the 'api_units' it spent
+    """
+    start_time = time.time()
+    result = {'input': url, 'video_id': None, 'status': 'failed', 'error': None,
+              'info': None, 'comments_df': None, 'replies_df': None}
+    try:
+        result['video_id'] = extract_video_id(url)
+        dataset = YouTubeData(result['video_id'], scheduler=scheduler)
+        result['info'] = dataset.get_video_info()
+        if comment_store is not None:
+            result['comments_df'], result['replies_df'] = comment_store.get_dataframes(dataset)
+        else:
+            result['comments_df'], result['replies_df'] = dataset.get_dataframes()
+        result['status'] = 'ok'
+    except DataRetrievalError as ex:
+        result['error'] = str(ex)
+    except Exception as ex:
+        logger.exception("Crawling %s failed", url)
+        result['error'] = str(ex)
+
+    result['elapsed'] = round(time.time() - start_time, 2)
+    result['api_units'] = scheduler.usage(result['video_id'])
+    return result
+
+
+def crawl(urls, max_workers=MAX_WORKERS, scheduler=None, comment_store=None):
+    """
+    Fetch many videos concurrently against a shared API unit budget.
+    A failing video (comments disabled, not found, ...) does not stop the batch.
+
+    :param urls: YouTube video URLs or IDs
+    :param max_workers: Videos fetched at the same time
+    :param scheduler: QuotaScheduler, a default budget is used when None
+    :param comment_store: Optional CommentStore to read & fill
+    :return: list of crawl results (see crawl_video), in input order
+    """
+    scheduler = scheduler or QuotaScheduler()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(propagate(lambda url: crawl_video(url, scheduler, comment_store)), urls))
+
+    logger.info("Crawled %d videos, %d failed, %d API units used", len(results),
+                sum(result['status'] != 'ok' for result in results), scheduler.used)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fetch the comments of many YouTube videos.")
+    parser.add_argument('urls', nargs='+', help="YouTube video URLs or IDs")
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS, help="Videos fetched at the same time")
+    parser.add_argument('--budget', type=int, default=None, help="API units the batch may spend")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    scheduler = QuotaScheduler() if args.budget is None else QuotaScheduler(budget=args.budget)
+    for result in crawl(args.urls, max_workers=args.workers, scheduler=scheduler):
+        comments = len(result['comments_df'].index) if result['status'] == 'ok' else 0
+        print(f"{result['input']}\t{result['status']}\t{comments} comments\t"
+              f"{result['elapsed']}s\t{result['api_units']} units\t{result['error'] or ''}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from app.channel import analyze_channel, parse_channel_url, MAX_VIDEOS
+from app.comment_store import merge_pages
+from app.metrics import collect
+from app.pipeline import bucket_counts, stream_analysis
+from app.sentiment_analyzer import SentimentAnalyzer
+from app.youtube_data import YouTubeData, extract_video_id, DataRetrievalError
+
+# Analyses running at the same time, queued beyond that
+JOB_WORKERS = int(os.environ.get("ANALYSIS_JOB_WORKERS", 2))
+# Finished jobs kept for result retrieval
+JOB_HISTORY = int(os.environ.get("ANALYSIS_JOB_HISTORY", 32))
+
+logger = logging.getLogger(__name__)
+
+
+def analyze_video(url, freq='M', comment_store=None, on_page=None):
+    """
+    Fetch, score & aggregate the comments of a video, page by page.
+
+    :param url: YouTube video URL or ID
+    :param freq: pandas frequency of the time buckets
+    :param comment_store: Optional CommentStore to read & fill
+    :param on_page: Optional callback, called with the StreamingAggregates after each page
+    :return: dict with the video 'info', the 'sentiment' SentimentAnalyzer holding the
+        scored comments, replies & threads, the per bucket counts of bucket_counts as
+        'buckets' and the 'elapsed' time in seconds
+    """
+    start_time = time.time()
+    dataset = YouTubeData(url)
+    info = dataset.get_video_info()
+
+    # Score each page of comments while the next one is fetched
+    sentiment = SentimentAnalyzer()
+    # A stored entry past its TTL is synced, then put back even when nothing new was scored
+    synced = comment_store is not None and not comment_store.is_fresh(dataset.video_id)
+    pages = comment_store.iter_pages(dataset) if comment_store is not None else dataset.iter_pages()
+    analyzed_pages = []
+    aggregates = None
+    for comments_page, replies_page, aggregates in stream_analysis(pages, sentiment, freq):
+        analyzed_pages.append((comments_page, replies_page))
+        if on_page is not None:
+            on_page(aggregates)
+
+    # Comments & Replies Dataframes, fetched once per video
+    comments_df, replies_df = merge_pages(analyzed_pages)
+    if comment_store is not None:
+        if synced:
+            # Keep the analysis so the next sync only scores new comments, and restart the TTL
+            comment_store.put(dataset.video_id, comments_df, replies_df)
+        logger.info("Comment store stats: %s", comment_store.stats())
+
+    # Interaction & sentiment counts per time bucket, shared by every trend chart
+    buckets = bucket_counts(comments_df, replies_df, freq)
+    sentiment.set_data(comments_df, replies_df)
+    sentiment.analyze_sentiment()
+
+    return {
+        'info': info,
+        'sentiment': sentiment,
+        'buckets': buckets,
+        'elapsed': round(time.time() - start_time, 2),
+    }
+
+
+def analyze_uploads(url, comment_store=None, max_videos=MAX_VIDEOS):
+    """
+    Compare the sentiment of the latest uploads of a channel, or of a playlist's videos.
+
+    :param url: Channel or playlist URL, channel ID, @handle or playlist ID
+    :param comment_store: Optional CommentStore to read & fill
+    :param max_videos: Most videos analyzed
+    :return: dict with the per video aggregates as 'videos' (see video_aggregates),
+        the channel-wide 'stats', the (input, error) of the 'failed' videos and the
+        'elapsed' time in seconds
+    """
+    start_time = time.time()
+    _, _, videos_df, results, stats = analyze_channel(url, max_videos, comment_store=comment_store)
+    return {
+        'videos': videos_df,
+        'stats': stats,
+        'failed': [(result['input'], result['error']) for result in results if result['status'] != 'ok'],
+        'elapsed': round(time.time() - start_time, 2),
+    }
+
+
+class Job:
+    """
+    An analysis submitted to a JobQueue, updated by its worker thread.
+    """
+
+    def __init__(self, job_id, key, url, freq):
+        self.id = job_id
+        self.key = key
+        self.url = url
+        # Bucket frequency of the first submission, the others are computed on demand
+        self.freq = freq
+        # 'channel' for a channel or playlist, 'video' otherwise
+        self.kind = key[0]
+        # 'queued', 'running', 'done' or 'failed'
+        self.status = 'queued'
+        self.pages = 0
+        # StreamingAggregates of the pages analyzed so far
+        self.aggregates = None
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.finished_at = None
+        # Timings & counters of the analysis, see Metrics.to_dict
+        self.metrics = None
+        # freq -> bucket_counts table of the finished analysis
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'failed')
+
+    def update(self, aggregates):
+        self.pages += 1
+        self.aggregates = aggregates
+
+    def buckets(self, freq=None):
+        """
+        :param freq: pandas frequency of the buckets, the job's one when None
+        :return: Per bucket counts of a finished video analysis, see bucket_counts
+        """
+        freq = freq or self.freq
+        if freq == self.freq:
+            return self.result['buckets']
+        with self._lock:
+            if freq not in self._buckets:
+                sentiment = self.result['sentiment']
+                self._buckets[freq] = bucket_counts(sentiment.comments_df, sentiment.replies_df, freq)
+            return self._buckets[freq]
+
+
+class JobQueue:
+    """
+    Runs analyses on a local thread pool, off the Streamlit script thread.
+    Jobs are looked up by ID, so a refreshed page can pick its job back up.
+    A submission for a video (at any bucket frequency) or a channel already
+    queued or running returns the existing job instead of starting another one.
+    """
+
+    def __init__(self, comment_store=None, max_workers=JOB_WORKERS, history=JOB_HISTORY):
+        """
+        :param comment_store: Optional CommentStore shared by the jobs
+        :param max_workers: Analyses running at the same time
+        :param history: Finished jobs kept for result retrieval
+        """
+        self.comment_store = comment_store
+        self.history = history
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='analysis')
+        self._jobs = OrderedDict()
+        self._active = {}
+        self._lock = threading.Lock()
+
+    def submit(self, url, freq='M'):
+        """
+        :param url: YouTube video URL or ID, or channel or playlist URL
+        :param freq: pandas frequency of the time buckets of a video, see Job.buckets for others
+        :return: Job of the analysis, an existing one for the same video or channel
+        :raises DataRetrievalError: If the URL is neither a video, a channel nor a playlist
+        """
+        channel = parse_channel_url(url)
+        key = ('channel', *channel) if channel else ('video', extract_video_id(url))
+        with self._lock:
+            if key in self._active:
+                return self._jobs[self._active[key]]
+            job = Job(uuid.uuid4().hex[:12], key, url, freq)
+            self._jobs[job.id] = job
+            self._active[key] = job.id
+            self._prune()
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id):
+        """
+        :param job_id: ID of a submitted job
+        :return: Job, or None when unknown or pruned from the history
+        """
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job):
+        job.status = 'running'
+        metrics = None
+        try:
+            with collect('analysis', job=job.id, kind=job.kind, url=job.url) as metrics:
+                if job.kind == 'channel':
+                    job.result = analyze_uploads(job.url, self.comment_store)
+                else:
+                    job.result = analyze_video(job.url, job.freq, self.comment_store, on_page=job.update)
+            job.status = 'done'
+        except DataRetrievalError as ex:
+            job.error = str(ex)
+            job.status = 'failed'
+        except Exception as ex:
+            logger.exception("Analysis %s of %s failed", job.id, job.url)
+            job.error = str(ex)
+            job.status = 'failed'
+        finally:
+            job.metrics = metrics.to_dict() if metrics is not None else None
+            job.finished_at = time.time()
+            with self._lock:
+                self._active.pop(job.key, None)
+
+    def _prune(self):
+        # Caller holds the lock. Jobs are ordered by submission, drop the oldest finished ones
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - self.history)]:
+            del self._jobs[job_id]
@@ -0,0 +1,207 @@
+"""
+Per-stage timings, counters & memory of an analysis.
+
+An analysis runs inside collect(), which makes a Metrics collector current
+for the calling context; span() and incr() anywhere below it record into
+that collector, and are no-ops outside of one. Worker threads only see the
+collector when their target is wrapped with propagate(). When the
+collection ends it is logged, appended to METRICS_FILE when set, and, with
+PROFILE_DIR set, a cProfile of the collecting thread is dumped for the
+analyses slower than PROFILE_MIN_SECONDS.
+"""
+import contextvars
+import cProfile
+import json
+import logging
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+# Optional JSON lines file every finished collection is appended to
+METRICS_FILE = os.environ.get("METRICS_FILE")
+# Opt-in profiling: directory the .prof files are written to
+PROFILE_DIR = os.environ.get("PROFILE_DIR")
+PROFILE_MIN_SECONDS = float(os.environ.get("PROFILE_MIN_SECONDS", 0))
+
+logger = logging.getLogger(__name__)
+
+_current = contextvars.ContextVar('metrics', default=None)
+_file_lock = threading.Lock()
+
+
+def _rss_mb():
+    # Current resident memory, Linux only
+    try:
+        with open('/proc/self/statm') as handle:
+            return int(handle.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except OSError:
+        return None
+
+
+class Metrics:
+
+    def __init__(self, name, **labels):
+        """
+        :param name: Name of the collection, e.g. 'analysis'
+        :param labels: Values identifying it, e.g. the video ID
+        """
+        self.name = name
+        self.labels = labels
+        # Stage -> [count, total seconds, max seconds]
+        self.spans = {}
+        self.counters = {}
+        self.started_at = time.time()
+        self.elapsed = None
+        self.rss_start_mb = _rss_mb()
+        self.rss_high_mb = self.rss_start_mb
+        self._lock = threading.Lock()
+
+    def add_span(self, name, seconds):
+        rss = _rss_mb()
+        with self._lock:
+            entry = self.spans.setdefault(name, [0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+            if rss is not None and rss > (self.rss_high_mb or 0):
+                self.rss_high_mb = rss
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def finish(self):
+        self.elapsed = time.time() - self.started_at
+
+    def to_dict(self):
+        """
+        :return: JSON serializable dict of the collection. Memory is sampled at
+            span ends ('rss_high_mb'); 'peak_rss_mb' is the process high-water mark
+        """
+        with self._lock:
+            return {
+                'name': self.name,
+                'labels': self.labels,
+                'elapsed_s': round(self.elapsed if self.elapsed is not None else time.time() - self.started_at, 3),
+                'spans': {name: {'count': count, 'total_s': round(total, 4), 'max_s': round(longest, 4)}
+                          for name, (count, total, longest) in self.spans.items()},
+                'counters': dict(self.counters),
+                'rss_start_mb': self.rss_start_mb and round(self.rss_start_mb, 1),
+                'rss_high_mb': self.rss_high_mb and round(self.rss_high_mb, 1),
+                'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            }
+
+
+def current():
+    """
+    :return: Metrics collector of the calling context, None outside of collect()
+    """
+    return _current.get()
+
+
+@contextmanager
+def span(name):
+    """
+    Time a stage into the current collector.
+
+    :param name: Stage name, e.g. 'api.request'
+    """
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add_span(name, time.perf_counter() - start_time)
+
+
+def timed(name):
+    """
+    Decorator version of span.
+
+    :param name: Stage name
+    """
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def incr(name, value=1):
+    """
+    :param name: Counter name, e.g. 'pages'
+    :param value: Amount added
+    """
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.incr(name, value)
+
+
+def propagate(function):
+    """
+    :param function: Target run by another thread
+    :return: function recording into the collector current when propagate was called
+    """
+    metrics = _current.get()
+    if metrics is None:
+        return function
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        token = _current.set(metrics)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            _current.reset(token)
+    return wrapper
+
+
+@contextmanager
+def collect(name, **labels):
+    """
+    Collect the metrics of everything run inside the block, then report them.
+
+    :param name: Name of the collection, e.g. 'analysis'
+    :param labels: Values identifying it, e.g. the video ID
+    :return: Metrics collector
+    """
+    # Only the outermost collection of a thread is profiled
+    profiler = cProfile.Profile() if PROFILE_DIR and _current.get() is None else None
+    metrics = Metrics(name, **labels)
+    token = _current.set(metrics)
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield metrics
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        _current.reset(token)
+        metrics.finish()
+        report(metrics)
+        if profiler is not None and metrics.elapsed >= PROFILE_MIN_SECONDS:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            path = os.path.join(PROFILE_DIR, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{id(metrics):x}.prof")
+            profiler.dump_stats(path)
+            logger.info("Profile of %s written to %s", name, path)
+
+
+def report(metrics):
+    """
+    Log a finished collection and append it to METRICS_FILE when set.
+
+    :param metrics: Metrics collector
+    """
+    line = json.dumps(metrics.to_dict(), default=str)
+    logger.info("Metrics: %s", line)
+    if METRICS_FILE:
+        with _file_lock, open(METRICS_FILE, 'a') as handle:
+            handle.write(line + '\n')
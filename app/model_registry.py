@@ -0,0 +1,105 @@
+import logging
+import os
+import threading
+import time
+
+from app.prediction_cache import PredictionCache, file_digest
+
+MODEL_DIR = os.environ.get("SENTIMENT_MODEL_DIR", os.path.join(os.path.dirname(__file__), '../train'))
+
+model_path = os.path.join(MODEL_DIR, 'yt_model.h5')
+numpy_model_path = os.path.join(MODEL_DIR, 'yt_model.npz')
+int8_model_path = os.path.join(MODEL_DIR, 'yt_model_int8.npz')
+student_model_path = os.path.join(MODEL_DIR, 'yt_student.npz')
+vocabulary_path = os.path.join(MODEL_DIR, 'yt_vocab.json')
+
+# 'keras' serves train/yt_model.h5 with TensorFlow, 'numpy' serves the weights
+# exported by train/export_model.py without it, 'int8' the same weights
+# quantized to int8 (4x smaller files), 'student' the distilled pooled-embedding
+# classifier of train/distill.py (several times faster, see train/model_report.md)
+BACKEND = os.environ.get("SENTIMENT_BACKEND", "keras")
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_models = {}
+_caches = {}
+
+
+def _load_keras():
+    from keras.models import load_model
+
+    from app.numpy_backend import NumpyTokenizer
+
+    # The exported vocabulary, not tokenizer.pkl: nothing is unpickled at startup
+    return load_model(model_path), NumpyTokenizer.load(vocabulary_path)
+
+
+def _load_numpy():
+    from app.numpy_backend import NumpyLSTM, NumpyTokenizer
+
+    return NumpyLSTM.load(numpy_model_path), NumpyTokenizer.load(vocabulary_path)
+
+
+def _load_int8():
+    from app.numpy_backend import NumpyLSTM, NumpyTokenizer
+
+    return NumpyLSTM.load(int8_model_path), NumpyTokenizer.load(vocabulary_path)
+
+
+def _load_student():
+    from app.numpy_backend import NumpyPooledClassifier, NumpyTokenizer
+
+    return NumpyPooledClassifier.load(student_model_path), NumpyTokenizer.load(vocabulary_path)
+
+
+LOADERS = {
+    'keras': _load_keras,
+    'numpy': _load_numpy,
+    'int8': _load_int8,
+    'student': _load_student,
+}
+
+# Files each backend is loaded from: their digest versions the cached predictions
+ARTIFACTS = {
+    'keras': [model_path, vocabulary_path],
+    'numpy': [numpy_model_path, vocabulary_path],
+    'int8': [int8_model_path, vocabulary_path],
+    'student': [student_model_path, vocabulary_path],
+}
+
+
+def get_model(backend=None):
+    """
+    Load the sentiment model & tokenizer of a backend once per process, on
+    first use. TensorFlow is imported here rather than at startup (and not
+    at all by the numpy backend), so rendering the page and every
+    Streamlit rerun don't pay for it.
+
+    :param backend: One of LOADERS, defaults to SENTIMENT_BACKEND
+    :return: tuple: model with a keras-like predict(), NumpyTokenizer
+    """
+    backend = backend or BACKEND
+    if backend not in LOADERS:
+        raise ValueError(f"Unknown sentiment backend '{backend}', expected one of {sorted(LOADERS)}")
+
+    if backend not in _models:
+        with _lock:
+            if backend not in _models:
+                start_time = time.perf_counter()
+                _models[backend] = LOADERS[backend]()
+                logger.info("Loaded %s sentiment model in %.2fs", backend, time.perf_counter() - start_time)
+    return _models[backend]
+
+
+def get_prediction_cache(backend=None):
+    """
+    :param backend: One of LOADERS, defaults to SENTIMENT_BACKEND
+    :return: Process-wide PredictionCache for the current files of the backend
+    """
+    backend = backend or BACKEND
+    if backend not in _caches:
+        with _lock:
+            if backend not in _caches:
+                _caches[backend] = PredictionCache(file_digest(ARTIFACTS[backend]), backend)
+    return _caches[backend]
@@ -0,0 +1,323 @@
+import hashlib
+import json
+from array import array
+
+import numpy as np
+
+# Format of the vocabulary files written by NumpyTokenizer.save
+VOCABULARY_VERSION = 2
+
+
+def pad_sequences(sequences, maxlen):
+    """
+    Same output as keras pad_sequences with its defaults: int32, zeros
+    padded and extra tokens truncated at the start of each sequence.
+
+    :param sequences: list of token ID lists
+    :param maxlen: Length of the padded sequences
+    :return: int32 array of shape (len(sequences), maxlen)
+    """
+    padded = np.zeros((len(sequences), maxlen), dtype=np.int32)
+    for row, sequence in enumerate(sequences):
+        if len(sequence) > maxlen:
+            sequence = sequence[len(sequence) - maxlen:]
+        if len(sequence):
+            padded[row, maxlen - len(sequence):] = sequence
+    return padded
+
+
+def _sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+def _softmax(logits):
+    logits = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return logits / logits.sum(axis=1, keepdims=True)
+
+
+def load_weights(path):
+    """
+    :param path: .npz of named arrays. An int8 quantized array is stored as
+        '<name>_int8' with its per-channel '<name>_scale' (see
+        train/export_model.py) and is returned dequantized to float32
+    :return: dict of name -> array
+    """
+    with np.load(path) as archive:
+        weights = {name: archive[name] for name in archive.files}
+    for name in [name[:-len('_int8')] for name in weights if name.endswith('_int8')]:
+        weights[name] = weights.pop(name + '_int8').astype(np.float32) * weights.pop(name + '_scale')
+    return weights
+
+
+def vocabulary_digest(config):
+    """
+    :param config: Vocabulary settings & words, without the digest
+    :return: SHA-256 hex digest of the canonical JSON of the vocabulary
+    """
+    canonical = json.dumps(config, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class NumpyTokenizer:
+    """
+    texts_to_sequences of the Keras Tokenizer, over the vocabulary written
+    by train/export_model.py, without importing TensorFlow or unpickling.
+
+    The vocabulary file is plain JSON: the tokenizer settings, the words in
+    ID order (ID = position + 1, top num_words - 1 words only), a format
+    'version' and the 'sha256' digest of the rest, checked on load so a
+    truncated or edited file fails instead of silently shifting IDs.
+    """
+
+    def __init__(self, words, num_words, filters, lower, split):
+        """
+        :param words: Vocabulary words, the word of ID i at position i - 1
+        :param num_words: Keras num_words: IDs from num_words up are never emitted
+        :param filters: Characters replaced by the split character
+        :param lower: Whether texts are lowercased first
+        :param split: Word separator
+        """
+        # Words beyond num_words are never emitted by Keras, drop them upfront
+        self.words = list(words[:max(0, num_words - 1)])
+        self.num_words = num_words
+        self.filters = filters
+        self.lower = lower
+        self.split = split
+        self.translate_map = str.maketrans(filters, split * len(filters))
+        self.word_index = {word: index for index, word in enumerate(self.words, start=1)}
+
+    @classmethod
+    def from_keras(cls, tokenizer):
+        """
+        :param tokenizer: Fitted word-level Keras Tokenizer without an OOV token
+        """
+        if tokenizer.oov_token is not None or tokenizer.char_level:
+            raise ValueError("Only word-level tokenizers without an OOV token can be exported")
+        num_words = tokenizer.num_words or len(tokenizer.word_index) + 1
+        words = sorted((index, word) for word, index in tokenizer.word_index.items() if index < num_words)
+        return cls([word for _, word in words], num_words, tokenizer.filters, tokenizer.lower, tokenizer.split)
+
+    def config(self):
+        return {
+            'version': VOCABULARY_VERSION,
+            'num_words': self.num_words,
+            'filters': self.filters,
+            'lower': self.lower,
+            'split': self.split,
+            'words': self.words,
+        }
+
+    def save(self, path):
+        config = self.config()
+        config['sha256'] = vocabulary_digest(config)
+        with open(path, 'w', encoding='utf-8') as handle:
+            json.dump(config, handle, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path):
+        """
+        :param path: Vocabulary file written by save
+        :raises ValueError: If the file is of a newer version or fails its digest check
+        """
+        with open(path, encoding='utf-8') as handle:
+            config = json.load(handle)
+        # Files exported before versioning have neither a version nor a digest
+        version = config.get('version', 1)
+        if version > VOCABULARY_VERSION:
+            raise ValueError(f"Vocabulary {path} is version {version}, this version reads up to {VOCABULARY_VERSION}")
+        digest = config.pop('sha256', None)
+        if version > 1 and digest != vocabulary_digest(config):
+            raise ValueError(f"Vocabulary {path} does not match its sha256 digest")
+        return cls(config['words'], config['num_words'], config['filters'], config['lower'], config['split'])
+
+    def _words(self, text):
+        if self.lower:
+            text = text.lower()
+        return text.translate(self.translate_map).split(self.split)
+
+    def texts_to_sequences(self, texts):
+        lookup = self.word_index.get
+        return [list(filter(None, map(lookup, self._words(text)))) for text in texts]
+
+    def encode(self, texts, maxlen):
+        """
+        Same IDs as pad_sequences(texts_to_sequences(texts), maxlen), without
+        the list per text: the IDs of all texts are collected in one flat
+        array and scattered into a preallocated matrix.
+
+        :param texts: Texts to encode
+        :param maxlen: Length of the padded sequences
+        :return: tuple: int32 array of shape (len(texts), maxlen), zeros padded and
+            extra tokens truncated at the start; int64 array of the sequence lengths
+            (capped at maxlen)
+        """
+        lookup = self.word_index.get
+        ids = array('i')
+        lengths = np.zeros(len(texts), dtype=np.int64)
+        for row, text in enumerate(texts):
+            start = len(ids)
+            ids.extend(filter(None, map(lookup, self._words(text))))
+            lengths[row] = len(ids) - start
+
+        padded = np.zeros((len(texts), maxlen), dtype=np.int32)
+        ids = np.frombuffer(ids, dtype=np.int32) if len(ids) else np.zeros(0, dtype=np.int32)
+        rows = np.repeat(np.arange(len(texts)), lengths)
+        # Position of each ID counted from the end of its sequence: the last maxlen are kept
+        from_end = np.cumsum(lengths)[rows] - 1 - np.arange(len(ids))
+        kept = from_end < maxlen
+        padded[rows[kept], maxlen - 1 - from_end[kept]] = ids[kept]
+        return padded, np.minimum(lengths, maxlen)
+
+
+class NumpyLSTM:
+    """
+    NumPy forward pass of the Embedding -> LSTM -> Dense(softmax) network
+    trained by train/train.py, from the weights written by
+    train/export_model.py. Serves the same predictions as the Keras model
+    without the TensorFlow runtime.
+    """
+
+    def __init__(self, embedding, lstm_kernel, lstm_recurrent_kernel, lstm_bias, dense_kernel, dense_bias,
+                 input_length):
+        self.input_shape = (None, int(input_length))
+        self.units = lstm_recurrent_kernel.shape[0]
+        # Project the whole embedding table through the input kernel once:
+        # a timestep is then a row lookup instead of a matmul
+        self.input_projection = (embedding @ lstm_kernel + lstm_bias).astype(np.float32)
+        self.recurrent_kernel = lstm_recurrent_kernel.astype(np.float32)
+        self.dense_kernel = dense_kernel.astype(np.float32)
+        self.dense_bias = dense_bias.astype(np.float32)
+        self.pad_states = self._pad_states()
+
+    def _pad_states(self):
+        """
+        Padding is a constant input, so the LSTM state after k padding steps
+        is the same for every sequence: compute it once for k = 0..input_length.
+
+        :return: tuple: hidden & cell states, each of shape (input_length + 1, units)
+        """
+        hidden = np.zeros((1, self.units), dtype=np.float32)
+        cell = np.zeros((1, self.units), dtype=np.float32)
+        padding = np.zeros((1, 1), dtype=np.int32)
+        hidden_states, cell_states = [hidden], [cell]
+        for _ in range(self.input_shape[1]):
+            hidden, cell = self._run(padding, hidden, cell)
+            hidden_states.append(hidden)
+            cell_states.append(cell)
+        return np.concatenate(hidden_states), np.concatenate(cell_states)
+
+    @classmethod
+    def load(cls, path):
+        return cls(**load_weights(path))
+
+    def predict(self, padded, batch_size=1024, verbose=0):
+        """
+        :param padded: int array of token IDs, shape (samples, input_length)
+        :param batch_size: Samples computed at once
+        :param verbose: Unused, for keras predict compatibility
+        :return: float32 array of class probabilities, shape (samples, classes)
+        """
+        padded = np.asarray(padded)
+        probabilities = np.zeros((len(padded), self.dense_bias.shape[0]), dtype=np.float32)
+        initial_hidden, initial_cell = self.pad_states[0][:1], self.pad_states[1][:1]
+        for start in range(0, len(padded), batch_size):
+            batch = padded[start:start + batch_size]
+            probabilities[start:start + batch_size] = self._classify(
+                self._run(batch, initial_hidden, initial_cell)[0])
+        return probabilities
+
+    def predict_sequences(self, sequences, batch_size=1024):
+        """
+        :param sequences: list of token ID lists
+        :param batch_size: Samples computed at once
+        :return: float32 array of class probabilities, shape (samples, classes), see predict_encoded
+        """
+        input_length = self.input_shape[1]
+        lengths = np.array([min(len(sequence), input_length) for sequence in sequences], dtype=np.int64)
+        return self.predict_encoded(pad_sequences(sequences, input_length), lengths, batch_size)
+
+    def predict_encoded(self, padded, lengths, batch_size=1024):
+        """
+        Same probabilities as predict(padded), without computing the padding
+        steps: sequences are sorted by length and cut into fixed-size
+        batches, each cut down to its longest sequence and started from the
+        precomputed state of the padding it skips. Results come back in the
+        input order.
+
+        :param padded: int array of token IDs, shape (samples, input_length), see NumpyTokenizer.encode
+        :param lengths: Tokens of each sequence, capped at input_length
+        :param batch_size: Samples computed at once
+        :return: float32 array of class probabilities, shape (samples, classes)
+        """
+        input_length = self.input_shape[1]
+        order = np.argsort(lengths, kind='stable')
+        probabilities = np.zeros((len(padded), self.dense_bias.shape[0]), dtype=np.float32)
+        for start in range(0, len(padded), batch_size):
+            rows = order[start:start + batch_size]
+            skipped = input_length - int(lengths[rows].max())
+            batch = padded[rows, skipped:]
+            hidden, cell = self.pad_states[0][skipped:skipped + 1], self.pad_states[1][skipped:skipped + 1]
+            probabilities[rows] = self._classify(self._run(batch, hidden, cell)[0])
+        return probabilities
+
+    def _run(self, batch, hidden, cell):
+        """
+        :param batch: int array of token IDs, shape (samples, steps)
+        :param hidden: Initial hidden state of one sample, repeated for each sample
+        :param cell: Initial cell state of one sample, repeated for each sample
+        :return: tuple: final hidden & cell states
+        """
+        units = self.units
+        # Real copies: matmul on a zero-stride broadcast view skips BLAS
+        hidden = np.repeat(hidden, len(batch), axis=0)
+        cell = np.repeat(cell, len(batch), axis=0)
+        for step in range(batch.shape[1]):
+            # Keras gate order: input, forget, cell candidate, output
+            z = self.input_projection[batch[:, step]] + hidden @ self.recurrent_kernel
+            input_gate = _sigmoid(z[:, :units])
+            forget_gate = _sigmoid(z[:, units:2 * units])
+            candidate = np.tanh(z[:, 2 * units:3 * units])
+            output_gate = _sigmoid(z[:, 3 * units:])
+            cell = forget_gate * cell + input_gate * candidate
+            hidden = output_gate * np.tanh(cell)
+        return hidden, cell
+
+    def _classify(self, hidden):
+        return _softmax(hidden @ self.dense_kernel + self.dense_bias)
+
+
+class NumpyPooledClassifier:
+    """
+    NumPy forward pass of the distilled student of train/distill.py:
+    mean of the token embeddings -> Dense(relu) -> Dense(softmax). No
+    recurrence, so a batch is a few matrix products instead of one per
+    timestep.
+    """
+
+    def __init__(self, embedding, hidden_kernel, hidden_bias, dense_kernel, dense_bias, input_length):
+        self.input_shape = (None, int(input_length))
+        self.embedding = embedding.astype(np.float32)
+        self.hidden_kernel = hidden_kernel.astype(np.float32)
+        self.hidden_bias = hidden_bias.astype(np.float32)
+        self.dense_kernel = dense_kernel.astype(np.float32)
+        self.dense_bias = dense_bias.astype(np.float32)
+
+    @classmethod
+    def load(cls, path):
+        return cls(**load_weights(path))
+
+    def predict(self, padded, batch_size=1024, verbose=0):
+        """
+        :param padded: int array of token IDs, shape (samples, input_length)
+        :param batch_size: Samples computed at once
+        :param verbose: Unused, for keras predict compatibility
+        :return: float32 array of class probabilities, shape (samples, classes)
+        """
+        padded = np.asarray(padded)
+        probabilities = np.zeros((len(padded), self.dense_bias.shape[0]), dtype=np.float32)
+        for start in range(0, len(padded), batch_size):
+            # Padding is averaged in too, as by the Keras GlobalAveragePooling1D it was trained with
+            pooled = self.embedding[padded[start:start + batch_size]].mean(axis=1)
+            hidden = np.maximum(pooled @ self.hidden_kernel + self.hidden_bias, 0)
+            probabilities[start:start + batch_size] = _softmax(hidden @ self.dense_kernel + self.dense_bias)
+        return probabilities
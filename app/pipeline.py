@@ -0,0 +1,187 @@
+import queue
+import threading
+
+import numpy as np
+import pandas as pd
+
+from app.metrics import propagate, span, timed
+from app.sentiment_analyzer import SENTIMENTS
+
+
+def prefetch(iterable, size=1):
+    """
+    Iterate over `iterable` in a background thread, keeping up to `size`
+    items ready, so producing the next item (e.g. an API page) overlaps with
+    processing the current one. Errors of the producer are re-raised here.
+
+    :param iterable: Items to produce
+    :param size: Items buffered ahead of the consumer
+    """
+    items = queue.Queue(maxsize=size)
+    stop = threading.Event()
+    done = object()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def produce():
+        try:
+            for item in iterable:
+                if stop.is_set():
+                    return
+                put((None, item))
+        except Exception as ex:
+            put((ex, None))
+        put((None, done))
+
+    threading.Thread(target=propagate(produce), daemon=True).start()
+    try:
+        while True:
+            error, item = items.get()
+            if error is not None:
+                raise error
+            if item is done:
+                return
+            yield item
+    finally:
+        # Unblock the producer when the consumer stops early
+        stop.set()
+
+
+# Time bucket choices of the trend charts: label -> pandas frequency
+TIME_BUCKETS = {'Day': 'D', 'Week': 'W', 'Month': 'M'}
+# Columns of the bucket tables
+BUCKET_COLUMNS = ['comment', 'reply'] + SENTIMENTS
+
+
+@timed('aggregate.buckets')
+def bucket_counts(comments_df, replies_df, freq='M'):
+    """
+    Count interactions & sentiments per time bucket, in one pass over the
+    frames. The charts only ever receive this table, one row per bucket.
+
+    :param comments_df: Scored comments dataframe
+    :param replies_df: Replies dataframe
+    :param freq: pandas frequency of the buckets, see TIME_BUCKETS
+    :return: Dataframe indexed by bucket, with 'comment', 'reply' and per
+        sentiment counts; empty buckets between the first & last are zeros
+    """
+    counts = []
+    if len(comments_df.index):
+        counts.append(comments_df.resample(freq, on='timestamp').size().rename('comment'))
+        counts.append(comments_df.groupby(
+            [pd.Grouper(key='timestamp', freq=freq), 'analysis'], observed=True).size().unstack(fill_value=0))
+    if len(replies_df.index):
+        counts.append(replies_df.resample(freq, on='timestamp').size().rename('reply'))
+    if not counts:
+        return pd.DataFrame(columns=BUCKET_COLUMNS, dtype=int)
+    counts = pd.concat(counts, axis=1).reindex(columns=BUCKET_COLUMNS)
+    return counts.asfreq(freq).fillna(0).astype(int)
+
+
+class StreamingAggregates:
+    """
+    Running totals of an analysis, updated page by page. Counts are kept
+    per day and only rolled up into time buckets when read, at any of the
+    TIME_BUCKETS frequencies.
+    """
+
+    def __init__(self, freq='M'):
+        """
+        :param freq: Default pandas frequency of the time buckets
+        """
+        self.freq = freq
+        self.comments = 0
+        self.replies = 0
+        self.scored = 0
+        self.sentiment_counts = pd.Series(0, index=SENTIMENTS)
+        # Day ordinal -> comment, reply & per sentiment counts
+        self._days = {}
+        self._lock = threading.Lock()
+
+    def _ordinals(self, timestamps):
+        """
+        :param timestamps: Series of timestamps
+        :return: int64 array of the ordinal of each timestamp's day
+        """
+        index = pd.DatetimeIndex(timestamps)
+        if index.tz is not None:
+            index = index.tz_convert(None)
+        return index.to_period('D').asi8
+
+    def _count(self, ordinals, columns):
+        """
+        :param ordinals: Day ordinals of the counted rows
+        :param columns: Index in BUCKET_COLUMNS of the count of each row
+        """
+        keys, counts = np.unique(ordinals * len(BUCKET_COLUMNS) + columns, return_counts=True)
+        with self._lock:
+            for key, count in zip(keys.tolist(), counts.tolist()):
+                ordinal, column = divmod(key, len(BUCKET_COLUMNS))
+                self._days.setdefault(ordinal, [0] * len(BUCKET_COLUMNS))[column] += count
+
+    def update(self, comments_df, replies_df, scored=0):
+        """
+        :param comments_df: Scored comments of the page
+        :param replies_df: Replies of the page
+        :param scored: Comments & replies of the page scored by the model
+        """
+        self.comments += len(comments_df.index)
+        self.replies += len(replies_df.index)
+        self.scored += scored
+
+        with span('aggregate.stream'):
+            if len(comments_df.index):
+                # Categorical codes follow SENTIMENTS, -1 for unscored comments
+                codes = comments_df['analysis'].cat.codes.to_numpy()
+                scored_rows = codes >= 0
+                self.sentiment_counts = self.sentiment_counts + np.bincount(
+                    codes[scored_rows], minlength=len(SENTIMENTS))
+                ordinals = self._ordinals(comments_df['timestamp'])
+                self._count(ordinals, 0)
+                self._count(ordinals[scored_rows], codes[scored_rows] + 2)
+            if len(replies_df.index):
+                self._count(self._ordinals(replies_df['timestamp']), 1)
+
+    def buckets(self, freq=None):
+        """
+        :param freq: pandas frequency of the buckets, the default one when None
+        :return: Dataframe like bucket_counts, None before the first comment
+        """
+        freq = freq or self.freq
+        with self._lock:
+            days = dict(self._days)
+        if not days:
+            return None
+        counts = pd.DataFrame.from_dict(days, orient='index', columns=BUCKET_COLUMNS)
+        # Day ordinals count days since the epoch
+        periods = pd.to_datetime(counts.index, unit='D').to_period(freq)
+        buckets = counts.groupby(periods.asi8).sum()
+        # Zero counts for the periods no page had rows in
+        index = pd.period_range(periods.min(), periods.max(), freq=periods.freq)
+        buckets = buckets.reindex(index.asi8, fill_value=0)
+        # Labelled like resample: the last day of the period, in UTC
+        buckets.index = index.to_timestamp(how='end').normalize().tz_localize('UTC')
+        return buckets
+
+
+def stream_analysis(pages, analyzer, freq='M'):
+    """
+    Score pages of comments while the next page is being fetched.
+
+    :param pages: iterable of (comments dataframe, replies dataframe), e.g. YouTubeData.iter_pages()
+    :param analyzer: SentimentAnalyzer scoring the comments & replies
+    :param freq: pandas frequency of the aggregated time buckets
+    :return: generator of (comments dataframe, replies dataframe, StreamingAggregates) per page,
+        the dataframes of the page being scored in place
+    """
+    aggregates = StreamingAggregates(freq)
+    for comments_df, replies_df in prefetch(pages):
+        scored = analyzer.score(comments_df, replies_df)
+        aggregates.update(comments_df, replies_df, scored)
+        yield comments_df, replies_df, aggregates
@@ -0,0 +1,126 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+# Optional SQLite file shared by every worker of the host, memory only when unset
+PREDICTION_CACHE_PATH = os.environ.get("PREDICTION_CACHE_PATH")
+PREDICTION_CACHE_SIZE = int(os.environ.get("PREDICTION_CACHE_SIZE", 100000))
+
+
+def file_digest(paths):
+    """
+    :param paths: Files a model is loaded from
+    :return: sha256 hex digest of their contents
+    """
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as handle:
+            for block in iter(lambda: handle.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+class PredictionCache:
+    """
+    Sentiment labels keyed by a hash of the cleaned text and the model
+    version: a bounded in-memory LRU, backed by an optional SQLite file.
+    A new model version never reads labels of an older one. The SQLite file
+    is shared by every backend; opening the cache only drops the rows of the
+    version its backend was last opened with, when that version changed.
+    """
+
+    def __init__(self, model_version, backend=None, max_entries=PREDICTION_CACHE_SIZE,
+                 path=PREDICTION_CACHE_PATH):
+        """
+        :param model_version: Digest of the model files
+        :param backend: Backend the model is served by, its stale rows are pruned
+        :param max_entries: Max labels kept in memory
+        :param path: SQLite file, None for a memory only cache
+        """
+        self.model_version = model_version
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0}
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+            with self._db:
+                self._db.execute('PRAGMA journal_mode=WAL')
+                self._db.execute('CREATE TABLE IF NOT EXISTS predictions '
+                                 '(key TEXT PRIMARY KEY, version TEXT NOT NULL, label TEXT NOT NULL)')
+                self._db.execute('CREATE INDEX IF NOT EXISTS predictions_version ON predictions (version)')
+                # Version each backend was last opened with
+                self._db.execute('CREATE TABLE IF NOT EXISTS model_versions '
+                                 '(backend TEXT PRIMARY KEY, version TEXT NOT NULL)')
+                if backend:
+                    self._prune(backend)
+
+    def _prune(self, backend):
+        # Caller is in a transaction
+        row = self._db.execute('SELECT version FROM model_versions WHERE backend = ?', (backend,)).fetchone()
+        if row and row[0] != self.model_version:
+            self._db.execute('DELETE FROM predictions WHERE version = ?', row)
+        self._db.execute('INSERT OR REPLACE INTO model_versions VALUES (?, ?)', (backend, self.model_version))
+
+    def key(self, text):
+        return hashlib.blake2b(f'{self.model_version}\0{text}'.encode('utf-8'), digest_size=16).hexdigest()
+
+    def get_many(self, texts):
+        """
+        :param texts: Cleaned texts, without duplicates
+        :return: dict of text -> label for the texts found
+        """
+        found = {}
+        missing = {}
+        with self._lock:
+            for text in texts:
+                key = self.key(text)
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    found[text] = self._entries[key]
+                else:
+                    missing[key] = text
+
+            if missing and self._db is not None:
+                keys = list(missing)
+                for start in range(0, len(keys), 500):
+                    chunk = keys[start:start + 500]
+                    rows = self._db.execute(
+                        'SELECT key, label FROM predictions '
+                        f"WHERE version = ? AND key IN ({','.join('?' * len(chunk))})", [self.model_version] + chunk)
+                    for key, label in rows:
+                        found[missing.pop(key)] = label
+                        self._remember(key, label)
+
+            self._counters['hits'] += len(found)
+            self._counters['misses'] += len(missing)
+        return found
+
+    def put_many(self, labels):
+        """
+        :param labels: dict of cleaned text -> label
+        """
+        rows = [(self.key(text), self.model_version, label) for text, label in labels.items()]
+        with self._lock:
+            for key, _, label in rows:
+                self._remember(key, label)
+            if self._db is not None:
+                with self._db:
+                    self._db.executemany('INSERT OR REPLACE INTO predictions VALUES (?, ?, ?)', rows)
+
+    def stats(self):
+        """
+        :return: dict of hit/miss counters and the memory entry count
+        """
+        with self._lock:
+            return dict(self._counters, entries=len(self._entries))
+
+    def _remember(self, key, label):
+        # Caller holds the lock
+        self._entries[key] = label
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
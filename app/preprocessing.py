@@ -0,0 +1,46 @@
+import os
+import re
+
+import pandas as pd
+
+from app.metrics import timed
+
+# NLTK's English stop words, bundled so startup needs no network or NLTK data
+stopwords_path = os.path.join(os.path.dirname(__file__), 'data/stopwords_english.txt')
+
+# Built once: rebuilding the set per text dominated cleaning time
+with open(stopwords_path) as handle:
+    STOP_WORDS = frozenset(handle.read().split())
+
+# Matched on lowercased text, after the symbols are gone: symbols can't
+# hide a URL (ht.tp://...) from the first pass and expose it to a second
+URL_PATTERN = re.compile(r'http\S+')
+# Mentions, then anything that is neither a word character nor whitespace
+# ('#' included), in a single pass
+SYMBOL_PATTERN = re.compile(r'@\w+|[^\w\s]')
+
+
+def clean_text(text):
+    """
+    Lowercase a text and remove its mentions, symbols, URLs & stop words.
+    Cleaning a cleaned text returns it unchanged.
+
+    :param text: Raw comment text
+    :return: Cleaned text
+    """
+    text = URL_PATTERN.sub('', SYMBOL_PATTERN.sub('', text.lower()))
+    return ' '.join(word for word in text.split() if word not in STOP_WORDS)
+
+
+@timed('clean')
+def clean_texts(texts):
+    """
+    Batch version of clean_text: every text is cleaned once, with the
+    precompiled patterns, in a single pass over the batch.
+
+    :param texts: Iterable or Series of raw texts
+    :return: Series of cleaned texts, keeping the index of a Series input
+    """
+    if not isinstance(texts, pd.Series):
+        texts = pd.Series(list(texts), dtype=object)
+    return pd.Series([clean_text(text) for text in texts], index=texts.index, dtype=object)
@@ -0,0 +1,135 @@
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+
+from googleapiclient.errors import HttpError
+
+from app.metrics import incr
+from app.youtube_data import DataRetrievalError
+
+# YouTube Data API v3 default project quota, in units per day
+QUOTA_BUDGET = int(os.environ.get("YOUTUBE_QUOTA_BUDGET", 10000))
+# Requests per second allowed by the token bucket
+REQUEST_RATE = float(os.environ.get("YOUTUBE_REQUEST_RATE", 10))
+
+# Reasons of a 403 response that are worth retrying; anything else (quotaExceeded,
+# commentsDisabled, forbidden, ...) will fail again
+RETRYABLE_REASONS = {'rateLimitExceeded', 'userRateLimitExceeded'}
+
+logger = logging.getLogger(__name__)
+
+
+class QuotaExceededError(DataRetrievalError):
+    pass
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: refills `rate` tokens per second up to `capacity`.
+    """
+
+    def __init__(self, rate, capacity=None):
+        """
+        :param rate: Tokens added per second
+        :param capacity: Max burst size, defaults to one second worth of tokens
+        """
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """
+        Block until `tokens` tokens are available and take them.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def _error_reason(ex):
+    try:
+        return json.loads(ex.content.decode('utf-8'))['error']['errors'][0]['reason']
+    except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+        return None
+
+
+class QuotaScheduler:
+    """
+    Schedules API requests against a budget of API units, rate limited by a
+    token bucket, retrying rate-limit (403/429) and server errors with
+    exponential backoff. Shared by every YouTubeData of a batch.
+    """
+
+    def __init__(self, budget=QUOTA_BUDGET, rate=REQUEST_RATE, max_retries=5, backoff=1.0):
+        """
+        :param budget: API units the scheduler may spend
+        :param rate: Requests per second
+        :param max_retries: Retries of a rate-limited or failed request
+        :param backoff: Base delay in seconds, doubled on each retry
+        """
+        self.budget = budget
+        self.bucket = TokenBucket(rate)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._used = 0
+        self._usage = defaultdict(int)
+        self._lock = threading.Lock()
+
+    @property
+    def used(self):
+        with self._lock:
+            return self._used
+
+    def usage(self, key):
+        """
+        :param key: Key the requests were charged to, e.g. a video ID
+        :return: API units spent for the key
+        """
+        with self._lock:
+            return self._usage.get(key, 0)
+
+    def execute(self, request, cost=1, key=None, http=None):
+        """
+        Execute an API request within the budget.
+
+        :param request: googleapiclient HttpRequest
+        :param cost: API units charged per attempt
+        :param key: Key the units are charged to
+        :param http: Connection to send the request on, the client's one when None
+        :raises QuotaExceededError: When the budget is spent
+        """
+        for attempt in range(self.max_retries + 1):
+            self._charge(cost, key)
+            self.bucket.acquire()
+            try:
+                return request.execute(http=http)
+            except HttpError as ex:
+                status = ex.resp.status
+                retryable = status == 429 or status >= 500 or (
+                        status == 403 and _error_reason(ex) in RETRYABLE_REASONS)
+                if not retryable or attempt == self.max_retries:
+                    raise
+                delay = self.backoff * (2 ** attempt) * (1 + random.random())
+                logger.warning("API request failed with %s, retrying in %.1fs", status, delay)
+                time.sleep(delay)
+
+    def _charge(self, cost, key):
+        with self._lock:
+            if self._used + cost > self.budget:
+                raise QuotaExceededError("API quota budget exhausted. Please try again later.")
+            self._used += cost
+            self._usage[key] += cost
+        incr('api_units', cost)
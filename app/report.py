@@ -0,0 +1,369 @@
+import math
+import os
+
+import altair as alt
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import streamlit as st
+
+from app.metrics import span, timed
+from app.utility import format_large_number
+
+PAGE_SIZES = [25, 50, 100, 250, 500]
+# Hard cap on the table rows sent to the browser per render, at least the smallest page
+MAX_TABLE_ROWS = max(PAGE_SIZES[0], int(os.environ.get("REPORT_MAX_TABLE_ROWS", 500)))
+# Sort order -> column & whether it is descending
+SORT_ORDERS = {'Most liked': ('likes', True), 'Least liked': ('likes', False),
+               'Newest': ('timestamp', True), 'Oldest': ('timestamp', False)}
+
+
+def new_line(count=1):
+    """
+    :param count: new line count
+    """
+    for _ in range(count):
+        st.write("\n")
+
+
+@timed('render.info')
+def parse_info(info, comments_count=0):
+    """
+    :param info: Video details
+    :param comments_count: length of comments
+    """
+    st.subheader(f":blue[{info['video_name']}]")
+    st.markdown(f"*- {info['channel_title']}*")
+    new_line(3)
+
+    info_col1, info_col2, info_col3 = st.columns(3)
+    info_col1.metric("Views", format_large_number(info["views"]))
+    info_col2.metric("Likes", format_large_number(info["likes"]))
+    info_col3.metric("Comments", format_large_number(comments_count))
+    new_line(3)
+
+
+@timed('render.sample')
+def parse_comments_dataset(comments_df):
+    """
+    :param comments_df: comments dataframe
+    """
+
+    st.markdown("##### Sample Dataset for Sentiment Analysis")
+    st.caption("This table represents the sample dataset used for sentiment analysis. "
+               "It consists of a single data point, serving as the foundation for analyzing "
+               "sentiment in the context of the application")
+    new_line()
+
+    selected_columns = ['comment', 'likes', 'replies_count', 'timestamp']
+    st.dataframe(comments_df.nlargest(1, 'likes')[selected_columns])
+    new_line(3)
+
+
+@timed('render.interactions')
+def plot_comments_replies_trend(buckets):
+    """
+    :param buckets: Per time bucket counts of bucket_counts
+    :return: None
+    """
+    new_line()
+
+    # DataFrame for Altair plotting, one row per bucket & parameter
+    melted_df = pd.melt(buckets.rename_axis('timestamp').reset_index(), id_vars=['timestamp'],
+                        value_vars=['comment', 'reply'], var_name='parameter', value_name='count')
+
+    # Plot graph for comments and replies
+    chart_comments_replies = alt.Chart(melted_df).mark_line().encode(
+        x='timestamp:T',
+        y='count:Q',
+        color='parameter:N',
+    ).interactive()
+
+    # Plot graph for comments alone
+    chart_comments_alone = alt.Chart(melted_df[melted_df['parameter'] == 'comment']).mark_line().encode(
+        x='timestamp:T',
+        y='count:Q',
+    ).interactive()
+
+    st.markdown("##### User Interaction Over Time")
+    st.caption("This chart visually represents the trend of user interaction, "
+               "showcasing the ebb and flow of comments and replies over the selected time period.")
+    new_line(2)
+
+    # Create two columns as tabs
+    col1, col2 = st.tabs(["Comments & Replies", "Comments"])
+
+    # Display charts based on the selected tab
+    with col1:
+        new_line(2)
+        st.altair_chart(chart_comments_replies, use_container_width=True)
+    with col2:
+        new_line(2)
+        st.altair_chart(chart_comments_alone, use_container_width=True)
+    new_line(3)
+
+
+@timed('render.partial')
+def plot_partial_results(placeholder, aggregates, freq=None):
+    """
+    Draw the results of an analysis still in progress, replacing the previous draw.
+
+    :param placeholder: st.empty() placeholder to draw into
+    :param aggregates: StreamingAggregates of the pages analyzed so far
+    :param freq: pandas frequency of the time buckets, the aggregates' one when None
+    """
+    buckets = aggregates.buckets(freq)
+    with placeholder.container():
+        st.caption(f"Analyzed {aggregates.comments} comments and {aggregates.replies} replies so far...")
+        st.bar_chart(aggregates.sentiment_counts)
+        if buckets is not None:
+            st.line_chart(buckets[['Positive', 'Neutral', 'Negative']])
+
+
+def results_page(comments_df, sentiments, order, page, page_size):
+    """
+    Filter, sort & slice the scored comments server side, so only one page
+    is ever sent to the browser. The page's rows are selected with a
+    partition, in linear time at any depth, and only they are sorted; ties
+    keep the row order.
+
+    :param comments_df: Scored comments dataframe
+    :param sentiments: Sentiments to keep
+    :param order: One of SORT_ORDERS
+    :param page: Page number, from 1
+    :param page_size: Rows per page, capped to MAX_TABLE_ROWS
+    :return: Page dataframe
+    """
+    page_size = min(page_size, MAX_TABLE_ROWS)
+    filtered_df = comments_df[comments_df['analysis'].isin(sentiments)]
+    start = (page - 1) * page_size
+    stop = min(page * page_size, len(filtered_df.index))
+    if start >= stop:
+        return filtered_df.iloc[:0]
+
+    column, descending = SORT_ORDERS[order]
+    if column == 'timestamp':
+        # Whole seconds, as published: keeps the key below within int64
+        values = pd.DatetimeIndex(filtered_df[column]).asi8 // 10 ** 9
+    else:
+        values = filtered_df[column].to_numpy(dtype=np.int64)
+    # Unique keys: one total order, ties broken by row position
+    keys = (-values if descending else values) * len(values) + np.arange(len(values))
+    rows = np.argpartition(keys, [start, stop - 1])[start:stop]
+    return filtered_df.iloc[rows[np.argsort(keys[rows])]]
+
+
+@timed('render.results_table')
+def show_results_table(comments_df):
+    """
+    Paginated & filterable table of the scored comments. The widgets are
+    keyed, so their values live in st.session_state and survive reruns.
+
+    :param comments_df: Scored comments dataframe
+    """
+    filter_col, order_col, size_col = st.columns([2, 1, 1])
+    sentiments = filter_col.multiselect("Sentiment", ['Positive', 'Neutral', 'Negative'],
+                                        default=['Positive', 'Neutral', 'Negative'], key='results_sentiments')
+    order = order_col.selectbox("Sort by", list(SORT_ORDERS), key='results_order')
+    page_size = size_col.selectbox("Rows per page", [size for size in PAGE_SIZES if size <= MAX_TABLE_ROWS],
+                                   key='results_page_size')
+
+    matches = int(comments_df['analysis'].isin(sentiments).sum())
+    page_count = max(1, math.ceil(matches / page_size))
+    # Back to a valid page when a filter shrinks the results
+    if st.session_state.get('results_page', 1) > page_count:
+        st.session_state['results_page'] = page_count
+    page = st.number_input("Page", min_value=1, max_value=page_count, step=1, key='results_page')
+
+    page_df = results_page(comments_df, sentiments, order, page, page_size)
+    st.dataframe(page_df[['comment', 'likes', 'analysis']], hide_index=True, use_container_width=True)
+    st.caption(f"Page {page} of {page_count}, {matches} matching comments")
+
+
+@timed('render.report')
+def show_report_and_plot(sentiment, buckets):
+    """
+    Plots sentiment analysis result on a chart
+    :param sentiment: SentimentAnalyzer holding the analyzed comments
+    :param buckets: Per time bucket counts of bucket_counts
+    :return: None
+    """
+    comments_df = sentiment.comments_df
+
+    st.markdown("##### Sentiment Analysis Results")
+
+    # Calculate the percentage & display pie chart
+    sentiment_counts = comments_df['analysis'].value_counts()
+
+    total_comments = len(comments_df)
+    percentage_positive = (sentiment_counts.get(
+        "Positive", 0) / total_comments) * 100
+    percentage_negative = (sentiment_counts.get(
+        "Negative", 0) / total_comments) * 100
+    percentage_neutral = (sentiment_counts.get(
+        "Neutral", 0) / total_comments) * 100
+
+    st.caption("The breakdown of user comments with positive, negative, and neutral sentiments "
+               "helps to understand the overall tone of audience interactions.")
+    if sentiment.labeled_count:
+        st.caption(f"{sentiment.cache_hit_rate:.0%} of the {sentiment.labeled_count} scored comments & replies "
+                   f"were duplicates or served from the prediction cache.")
+    fig = px.pie(
+        values=[percentage_positive,
+                percentage_negative, percentage_neutral],
+        names=['Positive', 'Negative', 'Neutral'],
+        labels={'label': 'Sentiment'},
+        color_discrete_sequence=[
+            "#1F77B4",
+            "#AEC7E8",
+            "#FF5252",
+        ],
+    )
+    with span('render.pie'):
+        st.plotly_chart(fig)
+
+    st.markdown("###### Sentiment Analysis Breakdown")
+    st.caption(
+        "Delve into the key takeaways from this table, which summarizes the sentiment—positive, negative, "
+        "or neutral—gleaned from analyzing YouTube comments.")
+    new_line(2)
+    # Result in tabular form, one page at a time
+    show_results_table(comments_df)
+    new_line(4)
+
+    st.markdown("###### Sentiment Distribution")
+    st.caption(
+        "This bar chart reveals the count of positive, negative, and neutral comments.")
+    new_line(2)
+
+    # Create a bar chart from the counts, not from the comments
+    counts_df = sentiment_counts.rename_axis('analysis').reset_index(name='count')
+    chart = alt.Chart(counts_df).mark_bar().encode(
+        x='analysis:N',
+        y='count:Q',
+        color=alt.Color('analysis:N', scale=alt.Scale(
+            domain=['Positive', 'Neutral', 'Negative'],
+            range=['#1F77B4', '#AEC7E8', '#FF5252']
+        )),
+    )
+    # Display the bar chart
+    with span('render.distribution'):
+        st.altair_chart(chart, use_container_width=True)
+    new_line(3)
+
+    st.markdown("###### Sentiment Over Time")
+    st.caption(
+        "This line chart illustrates changes in positive, negative, and neutral comments over time.")
+    new_line()
+
+    melted_df = pd.melt(buckets.rename_axis('timestamp').reset_index(), id_vars=['timestamp'],
+                        value_vars=['Positive', 'Neutral', 'Negative'], var_name='Sentiment', value_name='Count')
+
+    # Create & display line chart
+    overall_sentiment = alt.Chart(melted_df).mark_line().encode(
+        x='timestamp:T',
+        y='Count:Q',
+        color=alt.Color('Sentiment:N', scale=alt.Scale(
+            domain=['Positive', 'Neutral', 'Negative'],
+            range=['#1F77B4', '#AEC7E8', '#FF5252']
+        )),
+        tooltip=['timestamp:T', 'Count:Q', 'Sentiment:N']
+    ).interactive()
+
+    positive_sentiment = alt.Chart(melted_df[melted_df['Sentiment'] == 'Positive']).mark_line().encode(
+        x='timestamp:T',
+        y='Count:Q',
+        color=alt.value('#1F77B4'),
+    ).interactive()
+
+    negative_sentiment = alt.Chart(melted_df[melted_df['Sentiment'] == 'Negative']).mark_line().encode(
+        x='timestamp:T',
+        y='Count:Q',
+        color=alt.value('#FF5252'),
+    ).interactive()
+
+    neutral_sentiment = alt.Chart(melted_df[melted_df['Sentiment'] == 'Neutral']).mark_line().encode(
+        x='timestamp:T',
+        y='Count:Q',
+        color=alt.value('#AEC7E8'),
+    ).interactive()
+
+    # Create 4 columns as tabs
+    col1, col2, col3, col4 = st.tabs(
+        ["Overall", "Positive", "Neutral", "Negative"])
+
+    # Display charts based on the selected tab
+    with span('render.timeline'):
+        with col1:
+            st.altair_chart(overall_sentiment, use_container_width=True)
+        with col2:
+            st.altair_chart(positive_sentiment, use_container_width=True)
+        with col3:
+            st.altair_chart(neutral_sentiment, use_container_width=True)
+        with col4:
+            st.altair_chart(negative_sentiment, use_container_width=True)
+    new_line(3)
+
+    if sentiment.threads_df is not None:
+        plot_thread_sentiment(sentiment.threads_df)
+
+
+@timed('render.threads')
+def plot_thread_sentiment(threads_df, count=10):
+    """
+    :param threads_df: Per-thread rollups of thread_aggregates
+    :param count: Number of threads shown
+    """
+    st.markdown("###### Conversation Sentiment")
+    st.caption("The most discussed comments, with the sentiment of their replies and the like-weighted "
+               "sentiment of the whole thread, from -1 (negative) to 1 (positive).")
+    new_line(2)
+
+    top_threads = threads_df.nlargest(count, 'replies_count')
+    st.dataframe(top_threads[['comment', 'analysis', 'replies_Positive', 'replies_Neutral', 'replies_Negative',
+                              'weighted_sentiment']], hide_index=True)
+
+
+@timed('render.channel')
+def show_channel_report(result):
+    """
+    Side by side sentiment of the videos of a channel or playlist.
+
+    :param result: Result of jobs.analyze_uploads
+    """
+    videos_df = result['videos']
+    stats = result['stats']
+
+    st.markdown("##### Channel Sentiment")
+    new_line()
+    info_col1, info_col2, info_col3 = st.columns(3)
+    info_col1.metric("Videos", len(videos_df.index))
+    info_col2.metric("Comments", format_large_number(stats['comments']))
+    info_col3.metric("Like-weighted sentiment", f"{stats['weighted_sentiment']:+.2f}")
+    if result['failed']:
+        st.caption(f"{len(result['failed'])} videos could not be analyzed: "
+                   + ", ".join(f"{video} ({error})" for video, error in result['failed']))
+    new_line(2)
+
+    st.markdown("###### Sentiment by Video")
+    st.caption("Share of positive, neutral and negative comments on each video, latest upload first.")
+    new_line()
+
+    # One row per video & sentiment: the chart never embeds the comments
+    shares_df = videos_df[['title', 'Positive_share', 'Neutral_share', 'Negative_share']].melt(
+        id_vars=['title'], var_name='Sentiment', value_name='Share')
+    shares_df['Sentiment'] = shares_df['Sentiment'].str.replace('_share', '')
+    chart = alt.Chart(shares_df).mark_bar().encode(
+        x=alt.X('Share:Q', stack='normalize', axis=alt.Axis(format='%')),
+        y=alt.Y('title:N', sort=list(videos_df['title']), title=None),
+        color=alt.Color('Sentiment:N', scale=alt.Scale(
+            domain=['Positive', 'Neutral', 'Negative'],
+            range=['#1F77B4', '#AEC7E8', '#FF5252']
+        )),
+        tooltip=['title:N', 'Sentiment:N', alt.Tooltip('Share:Q', format='.0%')],
+    )
+    st.altair_chart(chart, use_container_width=True)
+    new_line(2)
+
+    st.dataframe(videos_df[['title', 'comments', 'Positive', 'Neutral', 'Negative', 'weighted_sentiment']],
+                 use_container_width=True)
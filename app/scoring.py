@@ -0,0 +1,127 @@
+import os
+import time
+
+import pandas as pd
+
+from app.crawler import crawl, MAX_WORKERS
+from app.sentiment_analyzer import SentimentAnalyzer
+
+# Extensions read & written by read_table / write_table
+TABLE_FORMATS = ('.parquet', '.csv', '.jsonl')
+
+
+def read_table(path):
+    """
+    :param path: .parquet, .csv or .jsonl file
+    :return: DataFrame
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.parquet':
+        return pd.read_parquet(path)
+    if extension == '.csv':
+        return pd.read_csv(path)
+    if extension == '.jsonl':
+        return pd.read_json(path, lines=True)
+    raise ValueError(f"Unsupported file type '{extension}', expected one of {TABLE_FORMATS}")
+
+
+def write_table(df, path):
+    """
+    :param df: DataFrame to write
+    :param path: .parquet, .csv or .jsonl file
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.parquet':
+        df.to_parquet(path, index=False)
+    elif extension == '.csv':
+        df.to_csv(path, index=False)
+    elif extension == '.jsonl':
+        df.to_json(path, orient='records', lines=True, date_format='iso')
+    else:
+        raise ValueError(f"Unsupported file type '{extension}', expected one of {TABLE_FORMATS}")
+
+
+def score_comments_file(path, analyzer=None):
+    """
+    Score the comments of an existing file.
+
+    :param path: .parquet, .csv or .jsonl file with a 'comment' column
+    :param analyzer: SentimentAnalyzer, a default one when None
+    :return: tuple: comments dataframe with the 'analysis' column, stats dict
+    """
+    analyzer = analyzer or SentimentAnalyzer()
+    comments_df = read_table(path)
+    if 'comment' not in comments_df:
+        raise ValueError(f"{path} has no 'comment' column")
+    comments_df['comment'] = comments_df['comment'].fillna('').astype(str)
+
+    start_time = time.time()
+    analyzer.score_comments(comments_df)
+    score_time = time.time() - start_time
+    return comments_df, {
+        'comments': len(comments_df.index),
+        'score_s': round(score_time, 2),
+        'comments_per_s': round(len(comments_df.index) / score_time, 1) if score_time else None,
+        'cache_hit_rate': round(analyzer.cache_hit_rate, 3),
+    }
+
+
+def _pending_rows(df):
+    # Rows without an analysis yet
+    return df[df['analysis'].isna()] if 'analysis' in df else df
+
+
+def score_videos(urls, analyzer=None, comment_store=None, scheduler=None, max_workers=MAX_WORKERS):
+    """
+    Fetch & score the comments and replies of many videos, without any UI.
+
+    :param urls: YouTube video URLs or IDs
+    :param analyzer: SentimentAnalyzer, a default one when None
+    :param comment_store: Optional CommentStore to read & fill
+    :param scheduler: Optional QuotaScheduler of the crawl
+    :param max_workers: Videos fetched at the same time
+    :return: tuple: comments & replies dataframes of every fetched video (with a
+        'video_id' column), crawl results (see crawl_video), stats dict
+    """
+    analyzer = analyzer or SentimentAnalyzer()
+
+    start_time = time.time()
+    results = crawl(urls, max_workers=max_workers, scheduler=scheduler, comment_store=comment_store)
+    fetch_time = time.time() - start_time
+
+    ok_results = [result for result in results if result['status'] == 'ok']
+    comments_df = pd.concat([result['comments_df'].assign(video_id=result['video_id']) for result in ok_results],
+                            ignore_index=True) if ok_results else pd.DataFrame()
+    replies_df = pd.concat([result['replies_df'].assign(video_id=result['video_id']) for result in ok_results],
+                           ignore_index=True) if ok_results else pd.DataFrame()
+
+    if ok_results:
+        comments_df['video_id'] = comments_df['video_id'].astype('category')
+        replies_df['video_id'] = replies_df['video_id'].astype('category')
+        # Videos with rows left to score, restored ones already carry their analysis
+        pending_videos = set(_pending_rows(comments_df)['video_id']) | set(_pending_rows(replies_df)['video_id'])
+
+        # One scoring pass over every video: shared deduplication, cache lookups & batches
+        analyzer.score(comments_df, replies_df)
+
+        if comment_store is not None and pending_videos:
+            # Keep the analysis so the next sync only scores new comments
+            replies_by_video = dict(tuple(replies_df.groupby('video_id', observed=True)))
+            for video_id, video_comments_df in comments_df.groupby('video_id', observed=True):
+                if video_id not in pending_videos:
+                    continue
+                video_replies_df = replies_by_video.get(video_id, replies_df.iloc[:0])
+                comment_store.put(video_id, video_comments_df.drop(columns='video_id').reset_index(drop=True),
+                                  video_replies_df.drop(columns='video_id').reset_index(drop=True))
+    score_time = time.time() - start_time - fetch_time
+
+    return comments_df, replies_df, results, {
+        'videos': len(results),
+        'failed': sum(result['status'] != 'ok' for result in results),
+        'comments': len(comments_df.index),
+        'replies': len(replies_df.index),
+        'fetch_s': round(fetch_time, 2),
+        'score_s': round(score_time, 2),
+        'comments_per_s': round(len(comments_df.index) / score_time, 1) if score_time else None,
+        'cache_hit_rate': round(analyzer.cache_hit_rate, 3),
+    }
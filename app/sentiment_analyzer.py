@@ -1,55 +1,128 @@
 import os
-import pickle
 
-import altair as alt
-import nltk
 import numpy as np
 import pandas as pd
-import plotly.express as px
-import streamlit as st
-from keras.models import load_model
-from keras.preprocessing.sequence import pad_sequences
-from nltk.corpus import stopwords
-from sklearn.feature_extraction.text import re
 
-from app.utility import new_line
-
-nltk.download('stopwords')
-
-model_path = os.path.join(os.path.dirname(__file__), '../train/yt_model.h5')
-tokenizer_path = os.path.join(os.path.dirname(__file__), '../train/tokenizer.pkl')
-
-
-def clean_data(comment):
-    text = re.sub(r'http\S+', '', comment)
-    text = re.sub(r'@\w+', '', text)
-    text = re.sub(r'#', '', text)
-    text = re.sub(r'[^\w\s]', '', text)
-    text = text.lower()
-    text = text.split()
-    stop_words = set(stopwords.words('english'))
-    text = [word for word in text if word not in stop_words]
-    text = ' '.join(text)
-    return text
+from app.metrics import incr, span, timed
+from app.model_registry import get_model, get_prediction_cache
+from app.preprocessing import clean_texts
+
+# Comments per inference batch
+BATCH_SIZE = int(os.environ.get("SENTIMENT_BATCH_SIZE", 256))
+
+SENTIMENTS = ['Positive', 'Neutral', 'Negative']
+# One byte code per row instead of a repeated Python string
+ANALYSIS_DTYPE = pd.CategoricalDtype(SENTIMENTS)
+POLARITY = {'Positive': 1, 'Neutral': 0, 'Negative': -1}
+
+
+@timed('aggregate.threads')
+def thread_aggregates(comments_df, replies_df):
+    """
+    Roll scored replies up to their top-level comment.
+
+    :param comments_df: Scored comments dataframe
+    :param replies_df: Scored replies dataframe
+    :return: One row per top-level comment with its reply sentiment mix
+        ('replies_Positive', 'replies_Neutral', 'replies_Negative') and its
+        'weighted_sentiment': the mean polarity (-1 to 1) of the comment and
+        its replies, each weighted by its likes + 1
+    """
+    reply_mix = (replies_df.groupby(['comment_id', 'analysis'], observed=True).size()
+                 .unstack(fill_value=0)
+                 .reindex(columns=SENTIMENTS, fill_value=0)
+                 .add_prefix('replies_'))
+
+    rows = pd.concat([comments_df[['id', 'analysis', 'likes']],
+                      replies_df[['comment_id', 'analysis', 'likes']].rename(columns={'comment_id': 'id'})],
+                     ignore_index=True)
+    weights = rows['likes'] + 1
+    weighted_polarity = rows['analysis'].astype(object).map(POLARITY) * weights
+    weighted_sentiment = weighted_polarity.groupby(rows['id']).sum() / weights.groupby(rows['id']).sum()
+
+    threads_df = comments_df[['id', 'comment', 'likes', 'replies_count', 'analysis']].merge(
+        reply_mix, left_on='id', right_index=True, how='left')
+    threads_df[reply_mix.columns] = threads_df[reply_mix.columns].fillna(0).astype(int)
+    threads_df['weighted_sentiment'] = threads_df['id'].map(weighted_sentiment)
+    return threads_df
 
 
 class SentimentAnalyzer:
 
-    def __init__(self):
+    def __init__(self, backend=None, batch_size=BATCH_SIZE):
+        """
+        :param backend: Inference backend ('keras', 'numpy', 'int8' or 'student'), defaults to SENTIMENT_BACKEND
+        :param batch_size: Comments per inference batch
+        """
         self.comments_df = None
         self.replies_df = None
-        # Load model
-        self.model = load_model(model_path)
-
-        # Load tokenizer
-        with open(tokenizer_path, 'rb') as handle:
-            self.tokenizer = pickle.load(handle)
+        self.threads_df = None
+        self.scored_count = 0
+        self.backend = backend
+        self.batch_size = batch_size
+        # Comments labeled by this analyzer, and how many of them the model had to score
+        self.labeled_count = 0
+        self.inferred_count = 0
+
+    @property
+    def model(self):
+        # Loaded once per process, on the first analysis
+        return get_model(self.backend)[0]
+
+    @property
+    def tokenizer(self):
+        return get_model(self.backend)[1]
 
     def get_sentiments(self, texts):
-        texts_cleaned = [clean_data(text) for text in texts]
-        texts_tokenized = self.tokenizer.texts_to_sequences(texts_cleaned)
-        texts_padded = pad_sequences(texts_tokenized, maxlen=self.model.input_shape[1])
-        predictions = self.model.predict(texts_padded, verbose=0)
+        return self._predict(clean_texts(texts))
+
+    @property
+    def cache_hit_rate(self):
+        """
+        :return: Share of the labeled comments that skipped the model, as
+            duplicates of another comment or from the prediction cache
+        """
+        return 1 - self.inferred_count / self.labeled_count if self.labeled_count else 0.0
+
+    def _predict(self, texts_cleaned):
+        """
+        Label cleaned texts, running the model only once per distinct text
+        missing from the prediction cache.
+
+        :param texts_cleaned: Texts already passed through clean_texts
+        :return: list of sentiment labels
+        """
+        texts_cleaned = list(texts_cleaned)
+        cache = get_prediction_cache(self.backend)
+        unique_texts = list(dict.fromkeys(texts_cleaned))
+        labels = cache.get_many(unique_texts)
+        missing_texts = [text for text in unique_texts if text not in labels]
+        if missing_texts:
+            predicted = dict(zip(missing_texts, self._infer(missing_texts)))
+            cache.put_many(predicted)
+            labels.update(predicted)
+
+        self.labeled_count += len(texts_cleaned)
+        self.inferred_count += len(missing_texts)
+        incr('texts_labeled', len(texts_cleaned))
+        incr('texts_inferred', len(missing_texts))
+        incr('prediction_cache_hits', len(unique_texts) - len(missing_texts))
+        return [labels[text] for text in texts_cleaned]
+
+    def _infer(self, texts_cleaned):
+        """
+        :param texts_cleaned: Texts already passed through clean_texts
+        :return: list of sentiment labels predicted by the model
+        """
+        model, tokenizer = self.model, self.tokenizer
+        with span('tokenize'):
+            texts_padded, lengths = tokenizer.encode(texts_cleaned, model.input_shape[1])
+        with span('predict'):
+            if hasattr(model, 'predict_encoded'):
+                # Length-bucketed batches, padded only as far as each batch needs
+                predictions = model.predict_encoded(texts_padded, lengths, batch_size=self.batch_size)
+            else:
+                predictions = model.predict(texts_padded, batch_size=self.batch_size, verbose=0)
         labels = np.argmax(predictions, axis=1)
         sentiment_map = {-1: 'Negative', 0: 'Neutral', 1: 'Positive'}
         predicted_sentiments = [sentiment_map[label - 1] for label in labels]
@@ -63,131 +136,56 @@ class SentimentAnalyzer:
         self.comments_df = comments_df
         self.replies_df = replies_df
 
+    @timed('score')
+    def score(self, comments_df, replies_df=None):
+        """
+        Score the comments and replies that have no analysis yet, in place,
+        in a single batched pass (a reply repeating a comment is inferred
+        once). Rows restored from the comment store keep their analysis, so
+        a synced video only scores what was fetched since the last run.
+
+        :param comments_df: Comments dataframe
+        :param replies_df: Optional replies dataframe
+        :return: Number of comments & replies scored
+        """
+        frames = [(comments_df, 'comment')]
+        if replies_df is not None:
+            frames.append((replies_df, 'reply'))
+
+        pending = []
+        for df, text_column in frames:
+            if 'analysis' not in df:
+                df['analysis'] = pd.Series(index=df.index, dtype=ANALYSIS_DTYPE)
+            elif df['analysis'].dtype != ANALYSIS_DTYPE:
+                df['analysis'] = df['analysis'].astype(ANALYSIS_DTYPE)
+            pending.append(df['analysis'].isna())
+        scored_count = int(sum(mask.sum() for mask in pending))
+        if not scored_count:
+            return 0
+
+        # The raw text is kept: each text is cleaned exactly once per scoring
+        # and re-running the analysis gives the same result
+        cleaned = [clean_texts(df.loc[mask, text_column]) for (df, text_column), mask in zip(frames, pending)]
+        labels = self._predict(pd.concat(cleaned, ignore_index=True))
+        start = 0
+        for (df, _), mask, texts in zip(frames, pending, cleaned):
+            df.loc[mask, 'analysis'] = labels[start:start + len(texts)]
+            start += len(texts)
+        return scored_count
+
+    def score_comments(self, comments_df):
+        """
+        :param comments_df: Comments dataframe
+        :return: Number of comments scored
+        """
+        return self.score(comments_df)
+
     def analyze_sentiment(self):
-        self.comments_df['comment'] = self.comments_df['comment'].apply(
-            clean_data)
-        self.comments_df['analysis'] = self.get_sentiments(self.comments_df['comment'])
+        """
+        Score the comments & replies set with set_data and roll them up per thread.
 
+        :return: Comments dataframe with the 'analysis' column
+        """
+        self.scored_count = self.score(self.comments_df, self.replies_df)
+        self.threads_df = thread_aggregates(self.comments_df, self.replies_df)
         return self.comments_df
-
-    def show_report_and_plot(self):
-        """
-        Plots sentiment analysis result on a chart
-        :return: None
-        """
-        st.markdown("##### Sentiment Analysis Results")
-
-        # Calculate the percentage & display pie chart
-        sentiment_counts = self.comments_df['analysis'].value_counts()
-
-        total_comments = len(self.comments_df)
-        percentage_positive = (sentiment_counts.get(
-            "Positive", 0) / total_comments) * 100
-        percentage_negative = (sentiment_counts.get(
-            "Negative", 0) / total_comments) * 100
-        percentage_neutral = (sentiment_counts.get(
-            "Neutral", 0) / total_comments) * 100
-
-        st.caption("The breakdown of user comments with positive, negative, and neutral sentiments "
-                   "helps to understand the overall tone of audience interactions.")
-        fig = px.pie(
-            values=[percentage_positive,
-                    percentage_negative, percentage_neutral],
-            names=['Positive', 'Negative', 'Neutral'],
-            labels={'label': 'Sentiment'},
-            color_discrete_sequence=[
-                "#1F77B4",
-                "#AEC7E8",
-                "#FF5252",
-            ],
-        )
-        st.plotly_chart(fig)
-
-        st.markdown("###### Sentiment Analysis Breakdown")
-        st.caption(
-            "Delve into the key takeaways from this table, which summarizes the sentiment—positive, negative, "
-            "or neutral—gleaned from analyzing YouTube comments.")
-        new_line(2)
-        # Result in tabular form
-        st.dataframe(
-            self.comments_df[["comment", "analysis"]])
-        new_line(4)
-
-        st.markdown("###### Sentiment Distribution")
-        st.caption(
-            "This bar chart reveals the count of positive, negative, and neutral comments.")
-        new_line(2)
-
-        # Create a bar chart
-        chart = alt.Chart(self.comments_df).mark_bar().encode(
-            x='analysis:N',
-            y='count():Q',
-            color=alt.Color('analysis:N', scale=alt.Scale(
-                domain=['Positive', 'Neutral', 'Negative'],
-                range=['#1F77B4', '#AEC7E8', '#FF5252']
-            )),
-        )
-        # Display the bar chart
-        st.altair_chart(chart, use_container_width=True)
-        new_line(3)
-
-        st.markdown("###### Sentiment Over Time")
-        st.caption(
-            "This line chart illustrates changes in positive, negative, and neutral comments over time.")
-        new_line()
-
-        # Group by timestamp and sentiment analysis, then count the occurrences
-        grouped_df = self.comments_df.groupby(
-            ['timestamp', 'analysis']).size().reset_index(name='count')
-        # Pivot the DataFrame to have separate columns for positive, negative, and neutral counts
-        pivot_df = grouped_df.pivot_table(index='timestamp', columns='analysis', values='count',
-                                          fill_value=0).reset_index()
-
-        # Resample the DataFrame to have daily counts
-        resampled_df = pivot_df.resample(
-            'M', on='timestamp').sum().reset_index()
-        melted_df = pd.melt(resampled_df, id_vars=['timestamp'], value_vars=['Positive', 'Neutral', 'Negative'],
-                            var_name='Sentiment', value_name='Count')
-
-        # Create & display line chart
-        overall_sentiment = alt.Chart(melted_df).mark_line().encode(
-            x='timestamp:T',
-            y='Count:Q',
-            color=alt.Color('Sentiment:N', scale=alt.Scale(
-                domain=['Positive', 'Neutral', 'Negative'],
-                range=['#1F77B4', '#AEC7E8', '#FF5252']
-            )),
-            tooltip=['timestamp:T', 'Count:Q', 'Sentiment:N']
-        ).interactive()
-
-        positive_sentiment = alt.Chart(melted_df[melted_df['Sentiment'] == 'Positive']).mark_line().encode(
-            x='timestamp:T',
-            y='Count:Q',
-            color=alt.value('#1F77B4'),
-        ).interactive()
-
-        negative_sentiment = alt.Chart(melted_df[melted_df['Sentiment'] == 'Negative']).mark_line().encode(
-            x='timestamp:T',
-            y='Count:Q',
-            color=alt.value('#FF5252'),
-        ).interactive()
-
-        neutral_sentiment = alt.Chart(melted_df[melted_df['Sentiment'] == 'Neutral']).mark_line().encode(
-            x='timestamp:T',
-            y='Count:Q',
-            color=alt.value('#AEC7E8'),
-        ).interactive()
-
-        # Create 4 columns as tabs
-        col1, col2, col3, col4 = st.tabs(
-            ["Overall", "Positive", "Neutral", "Negative"])
-
-        # Display charts based on the selected tab
-        with col1:
-            st.altair_chart(overall_sentiment, use_container_width=True)
-        with col2:
-            st.altair_chart(positive_sentiment, use_container_width=True)
-        with col3:
-            st.altair_chart(neutral_sentiment, use_container_width=True)
-        with col4:
-            st.altair_chart(negative_sentiment, use_container_width=True)
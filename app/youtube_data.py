@@ -1,18 +1,45 @@
 import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
+import numpy as np
 import pandas as pd
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
-from sklearn.feature_extraction.text import re
+from googleapiclient.http import build_http
+
+from app.metrics import incr, propagate, span
 
 API_KEY = os.environ.get("GOOGLE_API_KEY")
 
+COMMENT_COLUMNS = ['id', 'comment', 'likes', 'timestamp', 'replies_count']
+REPLY_COLUMNS = ['id', 'reply', 'likes', 'timestamp', 'comment_id']
+
+# Arrow-backed strings: one buffer per column instead of a Python object per text
+STRING_DTYPE = pd.StringDtype('pyarrow')
+
+VIDEO_ID_PATTERN = re.compile(r'^[\w-]{11}$')
+
+# Largest page the commentThreads endpoint serves (default is 20)
+MAX_RESULTS = 100
+# Partial response mask: only the keys get_dataframes reads
+THREAD_FIELDS = ('nextPageToken,'
+                 'items(id,snippet(totalReplyCount,topLevelComment(snippet({text},likeCount,publishedAt))),'
+                 'replies(comments(id,snippet({text},likeCount,publishedAt))))')
+REPLY_FIELDS = 'nextPageToken,items(id,snippet({text},likeCount,publishedAt))'
+# Threads whose full reply set is fetched at the same time
+REPLY_WORKERS = 8
+
 
 class DataRetrievalError(Exception):
     pass
 
 
 def extract_video_id(url):
+    # A bare video ID is accepted as is
+    if VIDEO_ID_PATTERN.match(url):
+        return url
     pattern = re.compile(
         r'^.*((youtu.be\/)|(v\/)|(\/u\/\w\/)|(embed\/)|(watch\?))\??v?=?([^#&?]*).*'
     )
@@ -23,20 +50,109 @@ def extract_video_id(url):
         raise DataRetrievalError("Invalid URL. Please enter a valid YouTube URL.")
 
 
-def clean_data(review):
-    no_punc = re.sub(r'[^\w\s]', '', review)
-    no_digits = ''.join([i for i in no_punc if not i.isdigit()])
-    return no_digits
-
-
 class YouTubeData:
 
-    def __init__(self, url):
+    def __init__(self, url, scheduler=None, text_format=None):
         """
-        :param url: YouTube Video URL
+        :param url: YouTube Video URL or video ID
+        :param scheduler: Optional QuotaScheduler every API request goes through
+        :param text_format: None to read the original comment text, or 'plainText'/'html'
+            to read the display text in that format
         """
         self.youtube = build('youtube', 'v3', developerKey=API_KEY)
         self.video_id = extract_video_id(url)
+        self.scheduler = scheduler
+        self.text_format = text_format
+        self.text_field = 'textOriginal' if text_format is None else 'textDisplay'
+        self._local = threading.local()
+
+    def _execute(self, request, http=None):
+        """
+        Execute an API request, through the quota scheduler when there is one.
+
+        :param http: Connection to send the request on, the client's one when None
+        """
+        incr('api_requests')
+        with span('api.request'):
+            if self.scheduler is None:
+                incr('api_units')
+                return request.execute(http=http)
+            return self.scheduler.execute(request, key=self.video_id, http=http)
+
+    def _thread_http(self):
+        """
+        :return: Connection of the calling reply worker, reused for all its requests
+            (httplib2 connections can't be shared between threads)
+        """
+        if not hasattr(self._local, 'http'):
+            self._local.http = build_http()
+        return self._local.http
+
+    def _append_reply(self, replies, reply_item, comment_id):
+        """
+        :param replies: dict of REPLY_COLUMNS -> list of values, appended to
+        :param reply_item: Reply resource of the API
+        :param comment_id: ID of the top-level comment
+        """
+        replies['id'].append(reply_item['id'])
+        replies['reply'].append(reply_item['snippet'][self.text_field])
+        replies['likes'].append(reply_item['snippet']['likeCount'])
+        replies['timestamp'].append(reply_item['snippet']['publishedAt'])
+        replies['comment_id'].append(comment_id)
+
+    def _get_replies(self, comment_id):
+        """
+        Page through every reply of a thread with comments.list.
+
+        :param comment_id: ID of the top-level comment
+        :return: dict of REPLY_COLUMNS -> list of values
+        """
+        http = self._thread_http()
+        replies = {column: [] for column in REPLY_COLUMNS}
+        params = {
+            'part': 'snippet',
+            'parentId': comment_id,
+            'maxResults': MAX_RESULTS,
+            'fields': REPLY_FIELDS.format(text=self.text_field),
+        }
+        if self.text_format is not None:
+            params['textFormat'] = self.text_format
+
+        while True:
+            response = self._execute(self.youtube.comments().list(**params), http=http)
+            for reply_item in response.get('items', []):
+                self._append_reply(replies, reply_item, comment_id)
+            if 'nextPageToken' not in response:
+                return replies
+            params['pageToken'] = response['nextPageToken']
+
+    def _get_all_replies(self, comment_ids, executor):
+        """
+        Fetch the full reply sets of many threads in parallel.
+
+        :param comment_ids: IDs of the top-level comments
+        :param executor: Reply workers of the iteration, reused from page to page
+        :return: list of reply columns (see _get_replies) per comment ID, in the same order
+        """
+        return list(executor.map(propagate(self._get_replies), comment_ids))
+
+    def _comment_threads_request(self, page_token=None):
+        """
+        :param page_token: Token of the page to request, None for the first one
+        :return: commentThreads.list request for a full page of the needed fields
+        """
+        params = {
+            'part': 'snippet,replies',
+            'videoId': self.video_id,
+            'order': 'time',
+            'maxResults': MAX_RESULTS,
+            'fields': THREAD_FIELDS.format(text=self.text_field),
+        }
+        if self.text_format is not None:
+            params['textFormat'] = self.text_format
+        if page_token is not None:
+            params['pageToken'] = page_token
+        return self.youtube.commentThreads().list(**params)
 
     def get_video_info(self):
         """
@@ -53,10 +169,10 @@ class YouTubeData:
 
         :raises VideoNotFoundError: If the video does not exist.
         """
-        video_info = self.youtube.videos().list(
+        video_info = self._execute(self.youtube.videos().list(
             part='snippet,statistics',
             id=self.video_id
-        ).execute()
+        ))
 
         # throw VideoNotFoundError when video doesn't exist
         if 'items' not in video_info or not video_info['items']:
@@ -82,10 +198,16 @@ class YouTubeData:
             'views': view_count
         }
 
-    def get_dataframes(self):
+    def get_dataframes(self, known_ids=None, newer_than=None):
         """
         Retrieve comments and their replies for a YouTube video.
 
+        Threads are requested newest first. For an incremental sync pass the
+        IDs of the comments already stored and/or the newest stored timestamp:
+        paging stops at the first thread that is already known, so only the
+        new threads are fetched. Replies posted later to known threads are not
+        picked up by an incremental sync.
+
         Returns a tuple of two DataFrames: one for top-level comments and
         another for replies.
 
@@ -106,79 +228,128 @@ class YouTubeData:
             'comment_id': '123'  # The corresponding top-level comment ID
         }
 
+        :param known_ids: IDs of top-level comments already stored
+        :param newer_than: Only fetch comments published at or after this timestamp
+
         Returns:
             tuple: Two DataFrames - one for top-level comments and another for replies.
         """
-        comments_data = []
-        replies_data = []
+        pages = list(self.iter_pages(known_ids, newer_than))
+        comments_dataframe = pd.concat([page[0] for page in pages], ignore_index=True)
+        replies_dataframe = pd.concat([page[1] for page in pages], ignore_index=True)
+        return comments_dataframe, replies_dataframe
 
+    def iter_pages(self, known_ids=None, newer_than=None):
+        """
+        Retrieve comments and their replies page by page, see get_dataframes.
+        Each page is yielded as soon as it is fetched, with the complete
+        replies of its threads, so it can be processed while the next page
+        is requested.
+
+        :param known_ids: IDs of top-level comments already stored
+        :param newer_than: Only fetch comments published at or after this timestamp
+        :return: generator of (comments dataframe, replies dataframe) per page
+        """
+        known_ids = known_ids or set()
+        if newer_than is not None:
+            newer_than = pd.Timestamp(newer_than)
+
+        # Started on the first truncated thread, its workers keep their connections until the last page
+        executor = ThreadPoolExecutor(max_workers=REPLY_WORKERS, thread_name_prefix='replies')
         try:
             # retrieve youtube video results
-            video_response = self.youtube.commentThreads().list(
-                part='snippet,replies',
-                videoId=self.video_id
-            ).execute()
+            video_response = self._execute(self._comment_threads_request())
 
-            if not video_response['items']:
+            if not video_response.get('items'):
                 raise DataRetrievalError("Failed to retrieve info. Try a different video.")
 
             # iterate video response
+            reached_known = False
             while video_response:
-                for item in video_response['items']:
+                # Accumulated column by column, then converted to typed arrays once per page
+                comments = {column: [] for column in COMMENT_COLUMNS}
+                replies = {column: [] for column in REPLY_COLUMNS}
+                truncated_threads = []
+                for item in video_response.get('items', []):
                     # Extracting top-level comment
                     top_level_comment_id = item['id']
-                    top_level_comment_text = item['snippet']['topLevelComment']['snippet']['textOriginal']
-                    top_level_comment_likes = item['snippet']['topLevelComment']['snippet']['likeCount']
-                    top_level_comment_timestamp = item['snippet']['topLevelComment']['snippet']['publishedAt']
-
-                    # Extracting replies
-                    replies_count = 0
-                    if 'replies' in item and 'comments' in item['replies']:
-                        for reply_item in item['replies']['comments']:
-                            reply_id = reply_item['id']
-                            reply_text = reply_item['snippet']['textOriginal']
-                            reply_likes = reply_item['snippet']['likeCount']
-                            reply_timestamp = reply_item['snippet']['publishedAt']
-
-                            replies_data.append({
-                                'id': reply_id,
-                                'reply': reply_text,
-                                'likes': reply_likes,
-                                'timestamp': reply_timestamp,
-                                'comment_id': top_level_comment_id,
-                            })
-                            replies_count += 1
-
-                    comments_data.append({
-                        'id': top_level_comment_id,
-                        'comment': top_level_comment_text,
-                        'likes': top_level_comment_likes,
-                        'timestamp': top_level_comment_timestamp,
-                        'replies_count': replies_count
-                    })
-
-                if 'nextPageToken' in video_response:
-                    video_response = self.youtube.commentThreads().list(
-                        part='snippet,replies',
-                        videoId=self.video_id,
-                        pageToken=video_response['nextPageToken']
-                    ).execute()
+                    top_level_comment = item['snippet']['topLevelComment']['snippet']
+                    top_level_comment_timestamp = top_level_comment['publishedAt']
+
+                    # Threads come newest first: everything from here on is already stored. publishedAt has
+                    # one-second resolution, threads of the newest stored second are left to known_ids
+                    if top_level_comment_id in known_ids or (
+                            newer_than is not None and pd.Timestamp(top_level_comment_timestamp) < newer_than):
+                        reached_known = True
+                        break
+
+                    # Extracting replies: a thread embeds at most 5 of them, the
+                    # complete set of a busier thread is fetched afterwards
+                    embedded_replies = item.get('replies', {}).get('comments', [])
+                    if item['snippet'].get('totalReplyCount', 0) > len(embedded_replies):
+                        truncated_threads.append(len(comments['id']))
+                    else:
+                        for reply_item in embedded_replies:
+                            self._append_reply(replies, reply_item, top_level_comment_id)
+                    comments['id'].append(top_level_comment_id)
+                    comments['comment'].append(top_level_comment[self.text_field])
+                    comments['likes'].append(top_level_comment['likeCount'])
+                    comments['timestamp'].append(top_level_comment_timestamp)
+                    comments['replies_count'].append(len(embedded_replies))
+
+                all_replies = self._get_all_replies([comments['id'][row] for row in truncated_threads], executor)
+                for row, thread_replies in zip(truncated_threads, all_replies):
+                    for column in REPLY_COLUMNS:
+                        replies[column].extend(thread_replies[column])
+                    comments['replies_count'][row] = len(thread_replies['id'])
+
+                next_page_token = video_response.get('nextPageToken')
+                with span('dataframe.build'):
+                    page = self._to_dataframes(comments, replies)
+                incr('pages')
+                incr('comments', len(page[0].index))
+                incr('replies', len(page[1].index))
+                yield page
+
+                if next_page_token and not reached_known:
+                    video_response = self._execute(self._comment_threads_request(next_page_token))
                 else:
                     break
 
-            comments_dataframe = pd.DataFrame(comments_data)
-            comments_dataframe["timestamp"] = pd.to_datetime(comments_dataframe["timestamp"])
-
-            replies_dataframe = pd.DataFrame(replies_data)
-            replies_dataframe["timestamp"] = pd.to_datetime(replies_dataframe["timestamp"])
-
-            return comments_dataframe, replies_dataframe
-
         except HttpError as ex:
             error_response = ex.content.decode('utf-8')
             if "commentsDisabled" in error_response:
                 raise DataRetrievalError("Comments are disabled for this video. Please try a different one.")
             raise DataRetrievalError("An unexpected error occurred. Please try your request again.")
+        except DataRetrievalError:
+            raise
         except Exception:
             raise DataRetrievalError(
                 "Unable to retrieve data. Please try again or consider choosing a different video.")
+        finally:
+            # Also runs when the consumer stops iterating early
+            executor.shutdown(cancel_futures=True)
+
+    @staticmethod
+    def _to_dataframes(comments, replies):
+        """
+        :param comments: dict of COMMENT_COLUMNS -> list of values
+        :param replies: dict of REPLY_COLUMNS -> list of values
+        :return: tuple: compact comments & replies dataframes
+        """
+        # Typed columns keep the schema when a page (or sync) result is empty
+        comments_dataframe = pd.DataFrame({
+            'id': pd.array(comments['id'], dtype=STRING_DTYPE),
+            'comment': pd.array(comments['comment'], dtype=STRING_DTYPE),
+            'likes': np.array(comments['likes'], dtype=np.int32),
+            'timestamp': pd.to_datetime(comments['timestamp'], utc=True, format='ISO8601'),
+            'replies_count': np.array(comments['replies_count'], dtype=np.int32),
+        })
+        replies_dataframe = pd.DataFrame({
+            'id': pd.array(replies['id'], dtype=STRING_DTYPE),
+            'reply': pd.array(replies['reply'], dtype=STRING_DTYPE),
+            'likes': np.array(replies['likes'], dtype=np.int32),
+            'timestamp': pd.to_datetime(replies['timestamp'], utc=True, format='ISO8601'),
+            'comment_id': pd.array(replies['comment_id'], dtype=STRING_DTYPE),
+        })
+        return comments_dataframe, replies_dataframe
@@ -0,0 +1,71 @@
+"""
+Peak memory of fetching & scoring a video's comments, and the size of the
+resulting dataframes, on the offline fake API of fake_youtube.py. Each size runs
+in its own process so its peak RSS is measured alone.
+
+    python bench/comment_memory.py --sizes 10000 100000 [--model-dir train]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+CHILD = '''
+import json, os, resource, sys, time
+sys.path.insert(0, {root!r})
+sys.path.insert(0, {bench!r})
+from fake_youtube import FakeYouTube
+from app.comment_store import merge_pages
+from app.pipeline import stream_analysis
+from app.sentiment_analyzer import SentimentAnalyzer
+from app.youtube_data import YouTubeData
+
+analyzer = SentimentAnalyzer()
+analyzer.model
+with open('/proc/self/statm') as handle:
+    baseline_mb = int(handle.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+
+dataset = YouTubeData('X3paOmcrTjQ')
+dataset.youtube = FakeYouTube({size})
+start_time = time.perf_counter()
+pages = [(comments_df, replies_df) for comments_df, replies_df, _ in stream_analysis(dataset.iter_pages(), analyzer)]
+comments_df, replies_df = merge_pages(pages)
+del pages
+elapsed = time.perf_counter() - start_time
+print(json.dumps({{
+    'elapsed_s': elapsed,
+    'comments': len(comments_df.index),
+    'replies': len(replies_df.index),
+    'frames_mb': (comments_df.memory_usage(deep=True).sum() + replies_df.memory_usage(deep=True).sum()) / 2 ** 20,
+    'peak_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 - baseline_mb,
+}}))
+'''
+
+
+def run_size(size, model_dir):
+    env = dict(os.environ, SENTIMENT_MODEL_DIR=os.path.abspath(model_dir), GOOGLE_API_KEY='bench')
+    env.setdefault('SENTIMENT_BACKEND', 'numpy')
+    child = CHILD.format(root=ROOT, bench=os.path.dirname(os.path.abspath(__file__)), size=size)
+    output = subprocess.run([sys.executable, '-c', child], env=env, check=True, capture_output=True,
+                            text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the memory of the comment dataframes.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000], help="Numbers of comments")
+    parser.add_argument('--model-dir', default=os.path.join(ROOT, 'train'), help="Directory of the model files")
+    args = parser.parse_args()
+
+    print(f"{'comments':>10}{'replies':>10}{'time':>9}{'dataframes':>13}{'peak RSS':>11}")
+    for size in args.sizes:
+        result = run_size(size, args.model_dir)
+        print(f"{result['comments']:>10}{result['replies']:>10}{result['elapsed_s']:>8.1f}s"
+              f"{result['frames_mb']:>10.1f} MB{result['peak_mb']:>8.0f} MB")
+
+
+if __name__ == '__main__':
+    main()
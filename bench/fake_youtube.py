@@ -0,0 +1,347 @@
+"""
+Local stand-in for the YouTube Data API client built by googleapiclient,
+serving the videos / commentThreads / comments endpoints (plus channels &
+playlistItems) without network or quota.
+
+- FakeYouTube generates synthetic videos of any size, page by page and
+  deterministically, so a million comments never sit in memory at once.
+- RecordingYouTube wraps a real client and saves its responses;
+  FakeYouTube.from_recording replays them.
+
+Like the API, both apply the 'fields' partial response mask of a request
+and count the bytes of the responses they serve (compact JSON). Both can
+add latency and inject the HTTP errors the quota scheduler retries:
+
+    from googleapiclient.discovery import build
+    recorder = RecordingYouTube(build('youtube', 'v3', developerKey=KEY))
+    ... run the pipeline with recorder as YouTubeData.youtube ...
+    recorder.save('recording.json')
+    fake = FakeYouTube.from_recording('recording.json', latency=0.05)
+"""
+import json
+import random
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlencode
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+WORDS = ('love this video great song best part so good why not bad worst ever the a and is was first time '
+         'watching again amazing thanks for sharing lol what who cares nice work boring too long hate it '
+         'awesome beautiful terrible music voice editing subscribe channel content deserves more views').split()
+# Replies embedded in a thread by commentThreads.list, the rest come from comments.list
+EMBEDDED_REPLIES = 5
+# HTTP status & error reason of the injected errors
+INJECTED_ERRORS = [(429, 'rateLimitExceeded'), (500, 'backendError'), (503, 'backendError'),
+                   (403, 'userRateLimitExceeded')]
+# Request parameters that don't change a response
+IGNORED_PARAMS = {'fields', 'key', 'part', 'textFormat'}
+
+
+def _request_key(resource, params):
+    return resource + '?' + urlencode(sorted((name, str(value)) for name, value in params.items()
+                                             if name not in IGNORED_PARAMS))
+
+
+def parse_fields(fields):
+    """
+    :param fields: Partial response mask, e.g. 'nextPageToken,items(id,snippet/likeCount)'
+    :return: nested dict of key -> selection within its value, {} for the whole value
+    """
+    def parse(pos):
+        tree = {}
+        while pos < len(fields):
+            end = pos
+            while end < len(fields) and fields[end] not in ',()':
+                end += 1
+            *parents, name = fields[pos:end].split('/')
+            node = tree
+            for parent in parents:
+                node = node.setdefault(parent, {})
+            pos = end
+            if pos < len(fields) and fields[pos] == '(':
+                node[name], pos = parse(pos + 1)
+            else:
+                node[name] = {}
+            if pos < len(fields) and fields[pos] == ')':
+                return tree, pos + 1
+            pos += 1
+        return tree, pos
+
+    return parse(0)[0]
+
+
+def partial_response(value, selection):
+    """
+    :param value: Response, or a value within it
+    :param selection: Result of parse_fields
+    :return: Copy of value with the selected keys only, lists filtered item by item
+    """
+    if not selection:
+        return value
+    if isinstance(value, list):
+        return [partial_response(item, selection) for item in value]
+    if isinstance(value, dict):
+        return {key: partial_response(value[key], sub) for key, sub in selection.items() if key in value}
+    return value
+
+
+class FakeRequest:
+
+    def __init__(self, client, respond):
+        self.client = client
+        self.respond = respond
+
+    def execute(self, http=None, num_retries=0):
+        self.client.wait_and_fail()
+        return self.respond()
+
+
+class FakeResource:
+
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+
+    def list(self, **params):
+        return FakeRequest(self.client, lambda: self.client.respond(self.name, params))
+
+
+class FakeYouTube:
+
+    def __init__(self, size=1000, reply_rate=0.5, latency=0.0, jitter=0.0, error_rate=0.0, seed=42,
+                 recording=None):
+        """
+        :param size: Top-level comments of every synthetic video
+        :param reply_rate: Mean replies per comment, some threads get many more than 5
+        :param latency: Seconds added to every request
+        :param jitter: Extra random seconds, up to this value, added to every request
+        :param error_rate: Probability of a request failing with a retryable HTTP error
+        :param seed: Seed of the synthetic data & of the injected errors
+        :param recording: dict of request key -> response served instead of synthetic data
+        """
+        self.size = size
+        self.reply_rate = reply_rate
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.seed = seed
+        self.recording = recording
+        self.requests = 0
+        self.errors = 0
+        self.bytes = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_recording(cls, path, **kwargs):
+        """
+        :param path: JSON file saved by RecordingYouTube.save
+        :param kwargs: Latency & error injection, see __init__
+        """
+        with open(path) as handle:
+            return cls(recording=json.load(handle), **kwargs)
+
+    def videos(self):
+        return FakeResource(self, 'videos')
+
+    def commentThreads(self):
+        return FakeResource(self, 'commentThreads')
+
+    def comments(self):
+        return FakeResource(self, 'comments')
+
+    def channels(self):
+        return FakeResource(self, 'channels')
+
+    def playlistItems(self):
+        return FakeResource(self, 'playlistItems')
+
+    def wait_and_fail(self):
+        with self._lock:
+            self.requests += 1
+            delay = self.latency + self._random.random() * self.jitter
+            fail = self._random.random() < self.error_rate
+            if fail:
+                self.errors += 1
+                status, reason = self._random.choice(INJECTED_ERRORS)
+        if delay:
+            time.sleep(delay)
+        if fail:
+            content = json.dumps({'error': {'code': status, 'errors': [{'reason': reason}]}}).encode('utf-8')
+            raise HttpError(httplib2.Response({'status': status}), content)
+
+    def respond(self, resource, params):
+        if self.recording is not None:
+            key = _request_key(resource, params)
+            if key not in self.recording:
+                raise HttpError(httplib2.Response({'status': 404}),
+                                json.dumps({'error': {'code': 404, 'message': f'Not recorded: {key}'}}).encode())
+            response = self.recording[key]
+        else:
+            response = getattr(self, f'_{resource}')(**params)
+        if params.get('fields'):
+            response = partial_response(response, parse_fields(params['fields']))
+        size = len(json.dumps(response, separators=(',', ':')).encode('utf-8'))
+        with self._lock:
+            self.bytes += size
+        return response
+
+    # Synthetic responses
+
+    def _text(self, rnd, max_words):
+        return ' '.join(rnd.choices(WORDS, k=rnd.randint(1, max_words)))
+
+    def _published_at(self, index):
+        # Newest first, one comment a minute
+        published = datetime(2023, 11, 1, tzinfo=timezone.utc) - timedelta(minutes=index)
+        return published.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+    def _thread(self, comment_id):
+        """
+        :return: tuple: text, likes & total reply count of a top-level comment,
+            the same for commentThreads.list & comments.list
+        """
+        rnd = random.Random(f'{self.seed}:{comment_id}')
+        # Most threads get no reply, a few get dozens
+        reply_count = int(rnd.expovariate(1 / self.reply_rate)) if self.reply_rate else 0
+        return self._text(rnd, 30), int(rnd.paretovariate(1.2)) - 1, reply_count
+
+    def _comment(self, comment_id, video_id, text, likes, published_at, parent_id=None):
+        """
+        :return: Full comment resource, as served without a fields mask
+        """
+        author = f"user{zlib.crc32(comment_id.encode()) % 100000}"
+        snippet = {
+            'channelId': 'UCsynthetic0000000000000',
+            'videoId': video_id,
+            'textDisplay': text,
+            'textOriginal': text,
+            'authorDisplayName': f'@{author}',
+            'authorProfileImageUrl': f'https://yt3.ggpht.com/ytc/{author}=s48-c-k-c0x00ffffff-no-rj',
+            'authorChannelUrl': f'http://www.youtube.com/@{author}',
+            'authorChannelId': {'value': f'UC{author:0>22}'},
+            'canRate': True,
+            'viewerRating': 'none',
+            'likeCount': likes,
+            'publishedAt': published_at,
+            'updatedAt': published_at,
+        }
+        if parent_id is not None:
+            snippet['parentId'] = parent_id
+        return {'kind': 'youtube#comment', 'etag': f'etag-{comment_id}', 'id': comment_id, 'snippet': snippet}
+
+    def _replies(self, comment_id, start, stop, published_at):
+        rnd = random.Random(f'{self.seed}:{comment_id}:replies')
+        video_id = comment_id.rsplit('.c', 1)[0]
+        replies = []
+        for index in range(stop):
+            text = self._text(rnd, 12)
+            likes = rnd.randint(0, 5)
+            if index >= start:
+                replies.append(self._comment(f'{comment_id}.r{index}', video_id, text, likes, published_at,
+                                             parent_id=comment_id))
+        return replies
+
+    def _page(self, kind, items, start, max_results, total):
+        response = {'kind': kind, 'etag': f'etag-{kind}-{start}',
+                    'pageInfo': {'totalResults': len(items), 'resultsPerPage': max_results}, 'items': items}
+        if start + max_results < total:
+            response['nextPageToken'] = str(start + max_results)
+        return response
+
+    def _videos(self, id, **params):
+        return {'items': [{
+            'snippet': {'title': f'Synthetic video {id}', 'channelTitle': 'Synthetic channel'},
+            'statistics': {'viewCount': str(self.size * 100), 'likeCount': str(self.size * 5)},
+        }]}
+
+    def _commentThreads(self, videoId, maxResults=20, pageToken=None, **params):
+        start = int(pageToken or 0)
+        items = []
+        for index in range(start, min(start + maxResults, self.size)):
+            comment_id = f'{videoId}.c{index}'
+            published_at = self._published_at(index)
+            text, likes, reply_count = self._thread(comment_id)
+            items.append({
+                'kind': 'youtube#commentThread',
+                'etag': f'etag-thread-{comment_id}',
+                'id': comment_id,
+                'snippet': {
+                    'channelId': 'UCsynthetic0000000000000',
+                    'videoId': videoId,
+                    'topLevelComment': self._comment(comment_id, videoId, text, likes, published_at),
+                    'canReply': True,
+                    'totalReplyCount': reply_count,
+                    'isPublic': True,
+                },
+                'replies': {'comments': self._replies(comment_id, 0, min(reply_count, EMBEDDED_REPLIES),
+                                                      published_at)},
+            })
+        return self._page('youtube#commentThreadListResponse', items, start, maxResults, self.size)
+
+    def _comments(self, parentId, maxResults=20, pageToken=None, **params):
+        start = int(pageToken or 0)
+        _, _, reply_count = self._thread(parentId)
+        index = int(parentId.rsplit('.c', 1)[1])
+        items = self._replies(parentId, start, min(reply_count, start + maxResults), self._published_at(index))
+        return self._page('youtube#commentListResponse', items, start, maxResults, reply_count)
+
+    def _channels(self, **params):
+        return {'items': [{'contentDetails': {'relatedPlaylists': {'uploads': 'UUsynthetic'}}}]}
+
+    def _playlistItems(self, playlistId, maxResults=5, pageToken=None, **params):
+        start = int(pageToken or 0)
+        video_ids = [f'synthetic{index:02d}' for index in range(50)]
+        response = {'items': [{'contentDetails': {'videoId': video_id}}
+                              for video_id in video_ids[start:start + maxResults]]}
+        if start + maxResults < len(video_ids):
+            response['nextPageToken'] = str(start + maxResults)
+        return response
+
+
+class RecordingYouTube:
+    """
+    Wraps a real googleapiclient YouTube client and keeps every response,
+    to be replayed offline with FakeYouTube.from_recording.
+    """
+
+    def __init__(self, youtube):
+        self.youtube = youtube
+        self.responses = {}
+        self._lock = threading.Lock()
+
+    def __getattr__(self, resource):
+        return lambda: _RecordingResource(self, resource)
+
+    def save(self, path):
+        with self._lock, open(path, 'w') as handle:
+            json.dump(self.responses, handle)
+
+
+class _RecordingResource:
+
+    def __init__(self, recorder, name):
+        self.recorder = recorder
+        self.name = name
+
+    def list(self, **params):
+        request = getattr(self.recorder.youtube, self.name)().list(**params)
+        return _RecordingRequest(self.recorder, _request_key(self.name, params), request)
+
+
+class _RecordingRequest:
+
+    def __init__(self, recorder, key, request):
+        self.recorder = recorder
+        self.key = key
+        self.request = request
+
+    def execute(self, http=None, num_retries=0):
+        response = self.request.execute(http=http, num_retries=num_retries)
+        with self.recorder._lock:
+            self.recorder.responses[self.key] = response
+        return response
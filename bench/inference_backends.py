@@ -0,0 +1,57 @@
+"""
+Latency & memory of the sentiment inference backends. Each backend runs in
+its own process so its import cost and peak RSS are measured alone.
+
+    python bench/inference_backends.py --size 10000 [--model-dir train]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+CHILD = '''
+import json, random, resource, sys, time
+sys.path.insert(0, {root!r})
+start_time = time.perf_counter()
+from app.sentiment_analyzer import SentimentAnalyzer
+analyzer = SentimentAnalyzer({backend!r})
+analyzer.model
+load_time = time.perf_counter() - start_time
+
+words = list(analyzer.tokenizer.word_index)[:5000]
+rnd = random.Random(42)
+texts = [' '.join(rnd.choice(words) for _ in range(rnd.randint(1, 20))) for _ in range({size})]
+start_time = time.perf_counter()
+analyzer._predict(texts)
+predict_time = time.perf_counter() - start_time
+print(json.dumps({{'load_s': load_time, 'predict_s': predict_time,
+                  'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}}))
+'''
+
+
+def run_backend(backend, size, model_dir):
+    env = dict(os.environ, SENTIMENT_MODEL_DIR=os.path.abspath(model_dir))
+    output = subprocess.run([sys.executable, '-c', CHILD.format(root=ROOT, backend=backend, size=size)],
+                            env=env, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the sentiment inference backends.")
+    parser.add_argument('--size', type=int, default=10000, help="Number of comments to score")
+    parser.add_argument('--model-dir', default=os.path.join(ROOT, 'train'), help="Directory of the model files")
+    parser.add_argument('--backends', nargs='+', default=['keras', 'numpy'])
+    args = parser.parse_args()
+
+    print(f"{'backend':<10}{'startup':>10}{'predict':>10}{'comments/s':>14}{'peak RSS':>12}")
+    for backend in args.backends:
+        result = run_backend(backend, args.size, args.model_dir)
+        print(f"{backend:<10}{result['load_s']:>9.2f}s{result['predict_s']:>9.2f}s"
+              f"{args.size / result['predict_s']:>14,.0f}{result['rss_mb']:>9.0f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""
+Throughput of the numpy backend with every comment padded to the model's
+input length against length-bucketed batches (predict_sequences).
+
+    python bench/inference_batching.py --sizes 10000 100000 [--model-dir train]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.append(ROOT)
+
+import numpy as np  # noqa: E402
+
+from app.numpy_backend import NumpyLSTM, pad_sequences  # noqa: E402
+
+
+def synthetic_sequences(size, input_length, vocabulary_size=5000, seed=42):
+    # Mostly short comments with a long tail, like YouTube comment sections
+    rnd = random.Random(seed)
+    lengths = [min(input_length, int(rnd.expovariate(1 / 6)) + 1) for _ in range(size)]
+    return [[rnd.randrange(1, vocabulary_size) for _ in range(length)] for length in lengths]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark length-bucketed inference.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000], help="Numbers of comments")
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--model-dir', default=os.path.join(ROOT, 'train'), help="Directory of yt_model.npz")
+    args = parser.parse_args()
+
+    model = NumpyLSTM.load(os.path.join(args.model_dir, 'yt_model.npz'))
+    print(f"input length {model.input_shape[1]}, batch size {args.batch_size}")
+    for size in args.sizes:
+        sequences = synthetic_sequences(size, model.input_shape[1])
+
+        start_time = time.perf_counter()
+        padded = model.predict(pad_sequences(sequences, model.input_shape[1]), batch_size=args.batch_size)
+        padded_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        bucketed = model.predict_sequences(sequences, batch_size=args.batch_size)
+        bucketed_time = time.perf_counter() - start_time
+
+        print(f"{size:>8} comments: padded {size / padded_time:>9,.0f}/s, bucketed {size / bucketed_time:>9,.0f}/s "
+              f"({padded_time / bucketed_time:.1f}x), max difference {np.abs(padded - bucketed).max():.1e}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Requests, quota units and response bytes of fetching a video's comments
+with pages of 20 (the API default) or 100 threads, with and without the
+partial response field mask of youtube_data.py. Runs on the synthetic
+videos of fake_youtube.py, or replays a recording saved by RecordingYouTube
+(only the page sizes the recording was made with can be replayed; record
+without a mask to measure what the mask saves).
+
+    python bench/page_size.py --size 10000 [--reply-rate 0.5]
+    python bench/page_size.py --recording recording.json --video-id X3paOmcrTjQ
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+os.environ.setdefault('GOOGLE_API_KEY', 'bench')
+
+from fake_youtube import FakeYouTube  # noqa: E402
+from app import youtube_data  # noqa: E402
+from app.youtube_data import DataRetrievalError, YouTubeData  # noqa: E402
+
+PAGE_SIZES = [20, 100]
+
+
+def run(fake, video_id, max_results, fields_mask):
+    """
+    :param fake: FakeYouTube serving the requests
+    :param max_results: maxResults of the commentThreads.list & comments.list requests
+    :param fields_mask: Send the partial response masks of youtube_data.py
+    :return: dict of counts, None when the recording lacks a request of the run
+    """
+    thread_fields, reply_fields = youtube_data.THREAD_FIELDS, youtube_data.REPLY_FIELDS
+    youtube_data.MAX_RESULTS = max_results
+    if not fields_mask:
+        # An empty mask is left out of the request
+        youtube_data.THREAD_FIELDS = youtube_data.REPLY_FIELDS = ''
+    try:
+        dataset = YouTubeData(video_id)
+        dataset.youtube = fake
+        comments = replies = 0
+        start_time = time.perf_counter()
+        for comments_df, replies_df in dataset.iter_pages():
+            comments += len(comments_df.index)
+            replies += len(replies_df.index)
+        elapsed = time.perf_counter() - start_time
+    except DataRetrievalError:
+        return None
+    finally:
+        youtube_data.THREAD_FIELDS, youtube_data.REPLY_FIELDS = thread_fields, reply_fields
+    # Every list request costs one quota unit
+    return {'comments': comments, 'replies': replies, 'requests': fake.requests, 'bytes': fake.bytes,
+            'elapsed_s': elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare API requests & bytes per page size and field mask.")
+    parser.add_argument('--size', type=int, default=10000, help="Top-level comments of the synthetic video")
+    parser.add_argument('--reply-rate', type=float, default=0.5, help="Mean replies per synthetic comment")
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds added to every API request")
+    parser.add_argument('--recording', help="Replay this RecordingYouTube file instead of synthetic data")
+    parser.add_argument('--video-id', default='X3paOmcrTjQ', help="Video of the recording")
+    args = parser.parse_args()
+
+    print(f"{'maxResults':>10}{'mask':>6}{'comments':>10}{'replies':>9}{'requests':>10}{'MB':>9}"
+          f"{'KB/request':>12}{'time':>9}")
+    for max_results in PAGE_SIZES:
+        for fields_mask in (False, True):
+            if args.recording:
+                fake = FakeYouTube.from_recording(args.recording, latency=args.latency)
+            else:
+                fake = FakeYouTube(args.size, reply_rate=args.reply_rate, latency=args.latency)
+            result = run(fake, args.video_id, max_results, fields_mask)
+            mask = 'yes' if fields_mask else 'no'
+            if result is None:
+                print(f"{max_results:>10}{mask:>6}  not in the recording")
+                continue
+            print(f"{max_results:>10}{mask:>6}{result['comments']:>10}{result['replies']:>9}"
+                  f"{result['requests']:>10}{result['bytes'] / 2 ** 20:>9.2f}"
+                  f"{result['bytes'] / result['requests'] / 1024:>12.1f}{result['elapsed_s']:>8.2f}s")
+
+
+if __name__ == '__main__':
+    main()
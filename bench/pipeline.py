@@ -0,0 +1,141 @@
+"""
+End to end benchmark of a video analysis (fetch -> clean -> score ->
+aggregate, as run by analyze_video) on the offline fake API of
+fake_youtube.py. Each size runs in its own process so its peak RSS is
+measured alone. Reports the wall time, the time of each stage (from the
+app's metrics spans), comments & replies per second and the peak RSS.
+
+    python bench/pipeline.py --sizes 1000 10000 100000 1000000 [--model-dir train]
+    python bench/pipeline.py --save-baseline bench/baseline.json
+    python bench/pipeline.py --baseline bench/baseline.json --tolerance 0.2
+
+With --baseline the run fails (exit code 1) when a size is slower, or
+needs more memory, than its baseline by more than the tolerance. Stages
+overlap (the next page is fetched while the current one is scored, replies
+are fetched by parallel workers), so stage times don't add up to the wall time.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Spans reported, in pipeline order
+STAGES = ['api.request', 'dataframe.build', 'clean', 'tokenize', 'predict', 'score', 'aggregate.stream',
+          'aggregate.buckets', 'aggregate.threads']
+
+CHILD = '''
+import json, sys
+sys.path.insert(0, {root!r})
+sys.path.insert(0, {bench!r})
+from fake_youtube import FakeYouTube
+from app import jobs
+from app.metrics import collect
+from app.quota import QuotaScheduler
+from app.youtube_data import YouTubeData
+
+fake = FakeYouTube({size}, latency={latency}, error_rate={error_rate})
+# Injected errors are retried by a scheduler, without its rate limit
+scheduler = QuotaScheduler(budget=10 ** 9, rate=10 ** 6, backoff=0.01) if {error_rate} else None
+
+
+class FakeYouTubeData(YouTubeData):
+
+    def __init__(self, url, scheduler=scheduler, text_format=None):
+        super().__init__(url, scheduler, text_format)
+        self.youtube = fake
+
+
+jobs.YouTubeData = FakeYouTubeData
+# Model load is not part of an analysis
+jobs.SentimentAnalyzer().model
+with collect('bench', size={size}) as metrics:
+    analysis = jobs.analyze_video('X3paOmcrTjQ', 'M')
+result = metrics.to_dict()
+result['requests'] = fake.requests
+result['injected_errors'] = fake.errors
+print(json.dumps(result))
+'''
+
+
+def run_size(size, model_dir, latency, error_rate):
+    env = dict(os.environ, SENTIMENT_MODEL_DIR=os.path.abspath(model_dir), GOOGLE_API_KEY='bench')
+    env.setdefault('SENTIMENT_BACKEND', 'numpy')
+    env.pop('METRICS_FILE', None)
+    child = CHILD.format(root=ROOT, bench=os.path.dirname(os.path.abspath(__file__)), size=size,
+                         latency=latency, error_rate=error_rate)
+    # A failing child's traceback goes straight to stderr
+    output = subprocess.run([sys.executable, '-c', child], env=env, check=True, stdout=subprocess.PIPE,
+                            text=True).stdout
+    metrics = json.loads(output.strip().splitlines()[-1])
+    counters = metrics['counters']
+    texts = counters.get('comments', 0) + counters.get('replies', 0)
+    return {
+        'comments': counters.get('comments', 0),
+        'replies': counters.get('replies', 0),
+        'requests': metrics['requests'],
+        'injected_errors': metrics['injected_errors'],
+        'elapsed_s': metrics['elapsed_s'],
+        'texts_per_s': round(texts / metrics['elapsed_s'], 1),
+        'peak_rss_mb': metrics['peak_rss_mb'],
+        'stages_s': {stage: metrics['spans'][stage]['total_s'] for stage in STAGES if stage in metrics['spans']},
+    }
+
+
+def regressions(results, baseline, tolerance):
+    """
+    :param results: dict of size -> result of run_size
+    :param baseline: Saved results of an earlier run
+    :param tolerance: Allowed relative slowdown or memory growth, e.g. 0.2
+    :return: list of messages, one per regression
+    """
+    messages = []
+    for size, result in results.items():
+        expected = baseline.get(size)
+        if expected is None:
+            continue
+        for key in ('elapsed_s', 'peak_rss_mb'):
+            if result[key] > expected[key] * (1 + tolerance):
+                messages.append(f"{size} comments: {key} {result[key]} vs baseline {expected[key]} "
+                                f"(+{result[key] / expected[key] - 1:.0%})")
+    return messages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the fetch, score & aggregate pipeline.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help="Numbers of top-level comments")
+    parser.add_argument('--model-dir', default=os.path.join(ROOT, 'train'), help="Directory of the model files")
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds added to every API request")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Share of API requests failing")
+    parser.add_argument('--save-baseline', help="Write the results to this JSON file")
+    parser.add_argument('--baseline', help="Compare the results to this JSON file")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed regression against the baseline")
+    args = parser.parse_args()
+
+    print(f"{'comments':>10}{'replies':>10}{'time':>9}{'texts/s':>10}{'peak RSS':>11}  stages")
+    results = {}
+    for size in args.sizes:
+        result = results[str(size)] = run_size(size, args.model_dir, args.latency, args.error_rate)
+        stages = ', '.join(f"{stage} {seconds:.2f}s" for stage, seconds in result['stages_s'].items())
+        print(f"{result['comments']:>10}{result['replies']:>10}{result['elapsed_s']:>8.2f}s"
+              f"{result['texts_per_s']:>10.0f}{result['peak_rss_mb']:>8.0f} MB  {stages}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as handle:
+            json.dump(results, handle, indent=2)
+        print(f"Baseline written to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as handle:
+            messages = regressions(results, json.load(handle), args.tolerance)
+        for message in messages:
+            print(f"REGRESSION {message}")
+        if messages:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
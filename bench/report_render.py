@@ -0,0 +1,81 @@
+"""
+Render time & browser payload of the Streamlit report by comment count,
+run headless with Streamlit's AppTest on synthetic scored comments.
+
+    python bench/report_render.py --sizes 1000 10000 100000
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.append(ROOT)
+
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+# Runs inside AppTest, with SIZE substituted
+REPORT_SCRIPT = """
+import sys
+sys.path.append({root!r})
+
+import numpy as np
+import pandas as pd
+
+from app.pipeline import bucket_counts
+from app.report import parse_comments_dataset, plot_comments_replies_trend, show_report_and_plot
+from app.sentiment_analyzer import SentimentAnalyzer, thread_aggregates
+
+rnd = np.random.default_rng(42)
+size = {size}
+comments_df = pd.DataFrame({{
+    'id': [f'c{{i}}' for i in range(size)],
+    'comment': [f'comment number {{i}} with a few words of text' for i in range(size)],
+    'likes': rnd.zipf(2, size).astype(int),
+    'replies_count': rnd.poisson(0.3, size),
+    'timestamp': pd.Timestamp('2023-01-01', tz='UTC') + pd.to_timedelta(rnd.integers(0, 3e7, size), unit='s'),
+    'analysis': rnd.choice(['Positive', 'Neutral', 'Negative'], size),
+}})
+replies_df = pd.DataFrame({{
+    'comment_id': comments_df['id'].sample(size // 3, replace=True, random_state=42).to_numpy(),
+    'reply': 'a reply',
+    'likes': 0,
+    'timestamp': pd.Timestamp('2023-06-01', tz='UTC'),
+    'analysis': 'Neutral',
+}})
+
+sentiment = SentimentAnalyzer()
+sentiment.set_data(comments_df, replies_df)
+sentiment.threads_df = thread_aggregates(comments_df, replies_df)
+buckets = bucket_counts(comments_df, replies_df)
+
+plot_comments_replies_trend(buckets)
+parse_comments_dataset(comments_df)
+show_report_and_plot(sentiment, buckets)
+"""
+
+
+def payload_bytes(tree):
+    # Serialized size of every element & block sent to the browser
+    return sum(node.proto.ByteSize() for node in tree if getattr(node, 'proto', None) is not None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the report rendering.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000], help="Numbers of comments")
+    args = parser.parse_args()
+
+    # Warm up imports, so the first size isn't charged for them
+    AppTest.from_string(REPORT_SCRIPT.format(root=ROOT, size=100), default_timeout=600).run()
+    for size in args.sizes:
+        app = AppTest.from_string(REPORT_SCRIPT.format(root=ROOT, size=size), default_timeout=600)
+        start_time = time.perf_counter()
+        app.run()
+        elapsed = time.perf_counter() - start_time
+        if app.exception:
+            raise RuntimeError(app.exception[0].value)
+        print(f"{size:>8} comments: render {elapsed:.2f}s, payload {payload_bytes(app._tree) / 1024:.0f} KB")
+
+
+if __name__ == '__main__':
+    main()
@@ -3,15 +3,34 @@ import time
 
 import streamlit as st
 
-from app.sentiment_analyzer import SentimentAnalyzer
-from app.utility import new_line, parse_info, parse_comments_dataset, plot_comments_replies_trend, SAMPLE_URL
-from app.youtube_data import YouTubeData
+from app.comment_store import CommentStore
+from app.jobs import JobQueue
+from app.metrics import collect
+from app.pipeline import TIME_BUCKETS
+from app.report import new_line, parse_info, parse_comments_dataset, plot_comments_replies_trend, \
+    plot_partial_results, show_channel_report, show_report_and_plot
+from app.utility import SAMPLE_URL
+from app.youtube_data import DataRetrievalError
 
 # Init logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-sentiment = SentimentAnalyzer()
+# Seconds between two refreshes of a running job
+POLL_INTERVAL = 1
+
+
+@st.cache_resource
+def get_comment_store():
+    # Shared across reruns and sessions so repeat analyses skip the API
+    return CommentStore()
+
+
+@st.cache_resource
+def get_job_queue():
+    # Shared across sessions: a refreshed page finds its job, identical submissions share one
+    return JobQueue(get_comment_store())
+
 
 # Configure the page
 st.set_page_config(page_title="YouTube Sentiment Analyzer", page_icon=None, layout="centered")
@@ -27,49 +46,77 @@ new_line()
 with st.form(key="input_form"):
     new_line()
     yt_url = st.text_input("Enter YouTube URL", value=SAMPLE_URL)
-    st.caption("Sample URL: https://www.youtube.com/watch?v=X3paOmcrTjQ")
+    st.caption("Sample URL: https://www.youtube.com/watch?v=X3paOmcrTjQ. "
+               "A channel or playlist URL compares the sentiment of its latest uploads.")
+    new_line()
+    time_bucket = st.selectbox("Group trends by", list(TIME_BUCKETS), index=list(TIME_BUCKETS).index('Month'))
     new_line()
     submit_btn = st.form_submit_button("Analyze", use_container_width=True)
     new_line()
 
+job_queue = get_job_queue()
+
 if submit_btn and yt_url:
-    with st.spinner("Analyzing... Please wait."):
-        try:
-            # StartTime: Calculate process time
-            start_time = time.time()
-
-            # Collect YouTube video details
-            dataset = YouTubeData(yt_url)
-            info = dataset.get_video_info()
-            # Comments Dataframe
-            comments_df = dataset.get_dataframes()[0]
-
-            # Replies Dataframe
-            replies_df = dataset.get_dataframes()[1]
-
-            # EndTime: Calculate process time
-            end_time = time.time()
-            new_line()
-            st.success(f"Analysis finished in {round(end_time - start_time, 2)}s")
-            new_line(3)
-
-            # 1. Parse and display video info
-            parse_info(info, len(comments_df.index))
-
-            # 2. Plot comments & replies trends in a chart
-            plot_comments_replies_trend(comments_df, replies_df)
-
-            # 3. Parse and display the sample dataset
-            parse_comments_dataset(comments_df)
-
-            # 4. Analyze the sentiment
-            sentiment.set_data(comments_df, replies_df)
-            sentiment.analyze_sentiment()
-
-            # 5. Display sentiment report
-            sentiment.show_report_and_plot()
-
-        except Exception as ex:
-            new_line()
-            error_msg = str(ex)
-            st.error(error_msg)
+    try:
+        job = job_queue.submit(yt_url, TIME_BUCKETS[time_bucket])
+        # The job ID lives in the URL, so a browser refresh keeps following it. The bucket
+        # frequency too: submissions of a video at other frequencies share its job
+        st.experimental_set_query_params(job=job.id, freq=TIME_BUCKETS[time_bucket])
+    except DataRetrievalError as ex:
+        new_line()
+        st.error(str(ex))
+
+query_params = st.experimental_get_query_params()
+job_id = query_params.get('job', [None])[0]
+job = job_queue.get(job_id) if job_id else None
+freq = query_params.get('freq', [None])[0]
+freq = freq if freq in TIME_BUCKETS.values() else None
+
+if job_id and job is None:
+    new_line()
+    st.warning("This analysis has expired. Please submit the video again.")
+elif job is not None and not job.finished:
+    new_line()
+    if job.aggregates is None:
+        st.caption("Analyzing... Please wait." if job.status == 'running' else "Waiting for a free worker...")
+    else:
+        st.caption(f"Fetched {job.pages} pages, scored {job.aggregates.scored} comments & replies...")
+        plot_partial_results(st.empty(), job.aggregates, freq)
+    time.sleep(POLL_INTERVAL)
+    st.rerun()
+elif job is not None and job.status == 'failed':
+    new_line()
+    st.error(job.error)
+elif job is not None and job.kind == 'channel':
+    new_line()
+    st.success(f"Analysis finished in {job.result['elapsed']}s")
+    new_line(3)
+    with collect('render', job=job.id):
+        show_channel_report(job.result)
+elif job is not None:
+    analysis = job.result
+    # A new report starts back on the first page of results
+    if st.session_state.get('report_job') != job.id:
+        st.session_state['report_job'] = job.id
+        st.session_state['results_page'] = 1
+
+    new_line()
+    st.success(f"Analysis finished in {analysis['elapsed']}s")
+    new_line(3)
+
+    comments_df = analysis['sentiment'].comments_df
+    buckets = job.buckets(freq)
+
+    # Render timings of each rerun, logged like the analysis ones
+    with collect('render', job=job.id):
+        # 1. Parse and display video info
+        parse_info(analysis['info'], len(comments_df.index))
+
+        # 2. Plot comments & replies trends in a chart
+        plot_comments_replies_trend(buckets)
+
+        # 3. Parse and display the sample dataset
+        parse_comments_dataset(comments_df)
+
+        # 4. Display sentiment report
+        show_report_and_plot(analysis['sentiment'], buckets)
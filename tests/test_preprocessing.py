@@ -0,0 +1,85 @@
+import re
+
+import pandas as pd
+import pytest
+
+from app.preprocessing import STOP_WORDS, clean_text, clean_texts
+
+CORPUS = [
+    "I love this video so much!! the best part was at 2:30",
+    "check http://t.co/xyz and https://www.youtube.com/watch?v=X3paOmcrTjQ&t=42s",
+    "see:https://example.com/path?a=1,b=2 thanks",
+    "@user123 you're WRONG, it's the best song ever #awesome #music",
+    "don't stop making these, it's AMAZING... worst ending ever :( 10/10 first!",
+    "Ñandú café naïve résumé über straße",
+    "emoji 😂😂 🔥 and    extra\twhitespace\nnew line",
+    "snake_case_words and under_scores stay, dashes-go",
+    "ALL CAPS SHOUTING ABOUT THE THE THE",
+    "",
+    "   ",
+    "!!!???",
+    "the a an and of to in",
+    "http",
+    "email me at someone@example.com",
+]
+
+# Inputs the former cleaning was not idempotent on
+IDEMPOTENCE_CASES = CORPUS + [
+    "HTTPS://WWW.YOUTUBE.COM/watch?v=X3paOmcrTjQ loud link",
+    "Http://mixed.case/link",
+    "ht.tp://split.by/symbols",
+    "h@ttp://mention.inside",
+    "İstanbul",
+]
+
+
+def nltk_clean_data(comment, stop_words):
+    # The cleaning of the first release, with NLTK's stop word list
+    text = re.sub(r'http\S+', '', comment)
+    text = re.sub(r'@\w+', '', text)
+    text = re.sub(r'#', '', text)
+    text = re.sub(r'[^\w\s]', '', text)
+    text = text.lower()
+    text = text.split()
+    text = [word for word in text if word not in stop_words]
+    text = ' '.join(text)
+    return text
+
+
+@pytest.fixture(scope='module')
+def nltk_stop_words():
+    stopwords = pytest.importorskip('nltk.corpus').stopwords
+    try:
+        return set(stopwords.words('english'))
+    except LookupError:
+        pytest.skip("NLTK stopwords corpus not downloaded")
+
+
+def test_bundled_stop_words_match_nltk(nltk_stop_words):
+    assert STOP_WORDS == nltk_stop_words
+
+
+@pytest.mark.parametrize('text', CORPUS)
+def test_clean_text_matches_nltk_reference(text, nltk_stop_words):
+    assert clean_text(text) == nltk_clean_data(text, nltk_stop_words)
+
+
+@pytest.mark.parametrize('text', IDEMPOTENCE_CASES)
+def test_clean_text_is_idempotent(text):
+    cleaned = clean_text(text)
+    assert clean_text(cleaned) == cleaned
+
+
+def test_clean_text_removes_urls_of_any_case():
+    assert clean_text("HTTPS://WWW.YOUTUBE.COM/watch loud link") == 'loud link'
+
+
+def test_clean_texts_matches_clean_text():
+    texts = pd.Series(CORPUS, index=range(10, 10 + len(CORPUS)))
+    cleaned = clean_texts(texts)
+    assert cleaned.index.equals(texts.index)
+    assert cleaned.tolist() == [clean_text(text) for text in CORPUS]
+
+
+def test_clean_texts_accepts_a_list():
+    assert clean_texts(CORPUS).tolist() == [clean_text(text) for text in CORPUS]
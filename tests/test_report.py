@@ -0,0 +1,47 @@
+import importlib
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app import report
+from app.report import SORT_ORDERS, results_page
+from app.sentiment_analyzer import ANALYSIS_DTYPE, SENTIMENTS
+
+
+@pytest.fixture(scope='module')
+def comments_df():
+    rng = np.random.default_rng(0)
+    size = 1000
+    return pd.DataFrame({
+        'id': [f'c{row}' for row in range(size)],
+        # Few distinct values, so most rows tie with others
+        'likes': rng.integers(0, 20, size),
+        'timestamp': pd.Timestamp('2023-11-01', tz='UTC') - pd.to_timedelta(rng.integers(0, 50, size), unit='s'),
+        'analysis': pd.Series(rng.choice(SENTIMENTS, size)).astype(ANALYSIS_DTYPE),
+    })
+
+
+@pytest.mark.parametrize('order', list(SORT_ORDERS))
+def test_pages_follow_a_stable_sort(comments_df, order):
+    column, descending = SORT_ORDERS[order]
+    sentiments = ['Positive', 'Negative']
+    expected = comments_df[comments_df['analysis'].isin(sentiments)].sort_values(
+        column, ascending=not descending, kind='stable')['id'].tolist()
+    pages = []
+    for page in range(1, len(expected) // 25 + 3):
+        pages += results_page(comments_df, sentiments, order, page, 25)['id'].tolist()
+    assert pages == expected
+
+
+def test_page_past_the_end_is_empty(comments_df):
+    assert results_page(comments_df, SENTIMENTS, 'Newest', 1000, 25).empty
+
+
+def test_max_table_rows_keeps_the_smallest_page_size(monkeypatch):
+    monkeypatch.setenv('REPORT_MAX_TABLE_ROWS', '10')
+    try:
+        assert importlib.reload(report).MAX_TABLE_ROWS == report.PAGE_SIZES[0]
+    finally:
+        monkeypatch.delenv('REPORT_MAX_TABLE_ROWS')
+        importlib.reload(report)
@@ -0,0 +1,64 @@
+import pandas as pd
+import pytest
+
+from app import youtube_data
+from app.youtube_data import YouTubeData
+
+
+@pytest.fixture(autouse=True)
+def api_key(monkeypatch):
+    # The client is built offline but needs a key, no request reaches the API
+    monkeypatch.setattr(youtube_data, 'API_KEY', 'test')
+
+
+class StubRequest:
+
+    def __init__(self, response):
+        self.response = response
+
+    def execute(self, http=None):
+        return self.response
+
+
+class StubYouTube:
+    """
+    Serves a single page of commentThreads.list, newest first.
+    """
+
+    def __init__(self, threads):
+        self.threads = threads
+
+    def commentThreads(self):
+        return self
+
+    def list(self, **params):
+        return StubRequest({'items': [{
+            'id': comment_id,
+            'snippet': {'totalReplyCount': 0,
+                        'topLevelComment': {'snippet': {'textOriginal': text, 'likeCount': 0,
+                                                        'publishedAt': published_at}}},
+        } for comment_id, text, published_at in self.threads]})
+
+
+def sync(threads, known_ids, newer_than):
+    dataset = YouTubeData('X3paOmcrTjQ')
+    dataset.youtube = StubYouTube(threads)
+    pages = list(dataset.iter_pages(known_ids=known_ids, newer_than=newer_than))
+    return pd.concat([comments_df for comments_df, _ in pages])['id'].tolist()
+
+
+def test_sync_reads_new_thread_of_the_newest_stored_second():
+    threads = [
+        ('new', 'posted in the same second', '2023-11-01T12:00:00Z'),
+        ('stored', 'newest stored thread', '2023-11-01T12:00:00Z'),
+        ('older', 'older stored thread', '2023-11-01T11:59:00Z'),
+    ]
+    assert sync(threads, {'stored', 'older'}, '2023-11-01T12:00:00Z') == ['new']
+
+
+def test_sync_stops_at_older_threads_without_known_ids():
+    threads = [
+        ('new', 'new thread', '2023-11-01T12:00:01Z'),
+        ('deleted', 'thread older than the stored ones', '2023-11-01T11:59:59Z'),
+    ]
+    assert sync(threads, set(), '2023-11-01T12:00:00Z') == ['new']
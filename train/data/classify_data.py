@@ -1,35 +1,22 @@
-import re
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
 import zipfile
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 
-import nltk
 import pandas as pd
-from nltk.corpus import stopwords
 from textblob import TextBlob
 
-nltk.download('stopwords')
+# Training & serving share the same cleaning, so their token streams match
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../..'))
+from app.preprocessing import clean_texts  # noqa: E402
 
-with zipfile.ZipFile('old_dataset.csv.zip', 'r') as zip_ref:
-    zip_ref.extractall()
-
-# Load dataset
-df = pd.read_csv('old_dataset.csv', encoding='ISO-8859-1', header=None)
-df.columns = ['target', 'ids', 'date', 'flag', 'user', 'text']
-
-
-def clean_text(text):
-    text = re.sub(r'http\S+', '', text)
-    text = re.sub(r'@\w+', '', text)
-    text = re.sub(r'#', '', text)
-    text = re.sub(r'[^\w\s]', '', text)
-    text = text.lower()
-    text = text.split()
-    stop_words = set(stopwords.words('english'))
-    text = [word for word in text if word not in stop_words]
-    text = ' '.join(text)
-    return text
-
-
-df['cleaned_text'] = df['text'].apply(clean_text)
+COLUMNS = ['target', 'ids', 'date', 'flag', 'user', 'text']
+CHUNK_SIZE = 50000
+CHECKPOINT_DIR = 'chunks'
 
 
 # find sentiment
@@ -43,8 +30,105 @@ def get_sentiment(text):
         return -1
 
 
-df['sentiment'] = df['cleaned_text'].apply(get_sentiment)
-new_df = df[['cleaned_text', 'sentiment']].rename(columns={'cleaned_text': 'comment'})
-new_df.to_csv('dataset.csv', index=False)
+def checkpoint_key(path, chunk_size):
+    # Checkpoints only hold the same rows when the source file & chunking are unchanged
+    stat = os.stat(path)
+    return {'source': os.path.abspath(path), 'size': stat.st_size, 'mtime': stat.st_mtime, 'chunk_size': chunk_size}
+
+
+def prepare_checkpoints(path, chunk_size):
+    """
+    Keep the checkpoints of a previous run of the same source & chunk size,
+    discard them otherwise.
+    """
+    manifest_path = os.path.join(CHECKPOINT_DIR, 'manifest.json')
+    key = checkpoint_key(path, chunk_size)
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as handle:
+            if json.load(handle) == key:
+                return
+    if os.path.exists(CHECKPOINT_DIR):
+        print(f"Discarding the checkpoints of a different input or chunk size in {CHECKPOINT_DIR}/")
+        shutil.rmtree(CHECKPOINT_DIR)
+    os.makedirs(CHECKPOINT_DIR)
+    with open(manifest_path, 'w') as handle:
+        json.dump(key, handle)
+
+
+def chunk_path(index):
+    return os.path.join(CHECKPOINT_DIR, f'chunk_{index:05d}.parquet')
+
+
+def label_chunk(index, chunk):
+    """
+    Clean & label a chunk of the dataset and checkpoint it to Parquet.
+
+    :param index: Position of the chunk in the CSV
+    :param chunk: Dataframe with a 'text' column
+    :return: Number of rows labeled
+    """
+    labeled = pd.DataFrame({'comment': clean_texts(chunk['text'])})
+    labeled['sentiment'] = labeled['comment'].apply(get_sentiment)
+
+    # Write then rename, so a crash never leaves a partial checkpoint behind
+    path = chunk_path(index)
+    labeled.to_parquet(path + '.tmp', index=False)
+    os.replace(path + '.tmp', path)
+    return len(labeled.index)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Clean & label the sentiment dataset.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Labeling processes")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="Rows per chunk")
+    args = parser.parse_args()
+
+    if not os.path.exists('old_dataset.csv'):
+        with zipfile.ZipFile('old_dataset.csv.zip', 'r') as zip_ref:
+            zip_ref.extractall()
+    prepare_checkpoints('old_dataset.csv', args.chunk_size)
+
+    # Chunks checkpointed by a previous run are skipped, so a crashed run resumes
+    reader = pd.read_csv('old_dataset.csv', encoding='ISO-8859-1', header=None, names=COLUMNS,
+                         usecols=['text'], chunksize=args.chunk_size)
+    start_time = time.time()
+    labeled_rows = 0
+    resumed_chunks = 0
+
+    def report(done):
+        nonlocal labeled_rows
+        if not done:
+            return
+        for future in done:
+            labeled_rows += future.result()
+        elapsed = time.time() - start_time
+        print(f"Labeled {labeled_rows} rows in {elapsed:.0f}s ({labeled_rows / elapsed:.0f} rows/s)")
+
+    chunks = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = set()
+        for index, chunk in enumerate(reader):
+            chunks += 1
+            if os.path.exists(chunk_path(index)):
+                resumed_chunks += 1
+                continue
+            # Bound the chunks in flight, the whole CSV is never held in memory
+            if len(futures) >= 2 * args.workers:
+                done, futures = wait(futures, return_when=FIRST_COMPLETED)
+                report(done)
+            futures.add(executor.submit(label_chunk, index, chunk))
+        report(wait(futures)[0])
+
+    if resumed_chunks:
+        print(f"Resumed {resumed_chunks} chunks from {CHECKPOINT_DIR}/")
+
+    # Only the chunks of this input, in order
+    new_df = pd.concat([pd.read_parquet(chunk_path(index)) for index in range(chunks)], ignore_index=True)
+    new_df.to_csv('dataset.csv', index=False)
+    new_df.to_parquet('dataset.parquet', index=False)
+
+    print(new_df.head())
+
 
-print(new_df.head())
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Distill the LSTM into a small pooled-embedding student for CPU-only nodes:
+Embedding -> GlobalAveragePooling1D -> Dense(relu) -> Dense(softmax),
+trained on the LSTM's predicted probabilities rather than on the labels.
+The student is served by the numpy backend (SENTIMENT_BACKEND=student).
+
+Run from ./train after train.py (which also calls it):
+
+    python distill.py
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from app.numpy_backend import NumpyTokenizer  # noqa: E402
+
+# Student size: embedding width & hidden units
+EMBEDDING_DIM = 32
+HIDDEN_UNITS = 32
+
+
+def build_student(num_words, input_length, classes=3, embedding_dim=EMBEDDING_DIM, hidden_units=HIDDEN_UNITS):
+    from keras.layers import Dense, Embedding, GlobalAveragePooling1D
+    from keras.models import Sequential
+
+    student = Sequential()
+    student.add(Embedding(input_dim=num_words, output_dim=embedding_dim, input_length=input_length))
+    student.add(GlobalAveragePooling1D())
+    student.add(Dense(hidden_units, activation='relu'))
+    student.add(Dense(classes, activation='softmax'))
+    student.compile(loss='kl_divergence', optimizer='adam')
+    return student
+
+
+def distill(teacher, X_train, X_val=None, epochs=10, batch_size=256):
+    """
+    :param teacher: Trained Keras LSTM
+    :param X_train: Padded token IDs the student learns the teacher's outputs on
+    :param X_val: Optional padded token IDs to validate on
+    :return: Trained Keras student
+    """
+    embedding = next(layer for layer in teacher.layers if layer.__class__.__name__ == 'Embedding')
+    student = build_student(embedding.input_dim, teacher.input_shape[1], teacher.output_shape[1])
+    validation_data = None
+    if X_val is not None:
+        validation_data = (X_val, teacher.predict(X_val, batch_size=1024, verbose=0))
+    student.fit(X_train, teacher.predict(X_train, batch_size=1024, verbose=0), epochs=epochs,
+                batch_size=batch_size, validation_data=validation_data, verbose=2)
+    return student
+
+
+def export_student_weights(student, path='yt_student.npz'):
+    """
+    :param student: Trained student of build_student
+    :param path: Output .npz path, read by NumpyPooledClassifier
+    """
+    embedding_layer, _, hidden_layer, dense_layer = student.layers
+    embedding, = embedding_layer.get_weights()
+    hidden_kernel, hidden_bias = hidden_layer.get_weights()
+    dense_kernel, dense_bias = dense_layer.get_weights()
+    np.savez(path, embedding=embedding, hidden_kernel=hidden_kernel, hidden_bias=hidden_bias,
+             dense_kernel=dense_kernel, dense_bias=dense_bias, input_length=student.input_shape[1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distill yt_model.h5 into a pooled-embedding student.")
+    parser.add_argument('--dataset', default='data/dataset.csv', help="Texts the student is trained on")
+    parser.add_argument('--epochs', type=int, default=10, help="Training epochs")
+    args = parser.parse_args()
+
+    from keras.models import load_model
+
+    teacher = load_model('yt_model.h5')
+    tokenizer = NumpyTokenizer.load('yt_vocab.json')
+    texts = pd.read_csv(args.dataset, encoding='ISO-8859-1', header=0)['comment'].dropna().tolist()
+    X, _ = tokenizer.encode(texts, teacher.input_shape[1])
+    export_student_weights(distill(teacher, X, epochs=args.epochs))
+    print("Exported yt_student.npz")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""
+Export the trained Keras model & tokenizer for the analyzer:
+
+- yt_model.npz: Embedding, LSTM and Dense weights of the TensorFlow-free
+  numpy backend (SENTIMENT_BACKEND=numpy)
+- yt_model_int8.npz: The same weights quantized to int8 (SENTIMENT_BACKEND=int8)
+- yt_vocab.json: Tokenizer vocabulary & settings, versioned & digest-checked
+  (see NumpyTokenizer), read by both backends: the app never loads tokenizer.pkl
+
+Run from ./train after train.py (which also calls it):
+
+    python export_model.py --check
+"""
+import argparse
+import os
+import pickle
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from app.numpy_backend import NumpyLSTM, NumpyTokenizer  # noqa: E402
+
+
+def _lstm_weights(model):
+    """
+    :param model: Trained Embedding -> SpatialDropout1D -> LSTM -> Dense Keras model
+    :return: dict of the arrays NumpyLSTM is built from
+    """
+    layers = {layer.__class__.__name__: layer for layer in model.layers}
+    embedding, = layers['Embedding'].get_weights()
+    lstm_kernel, lstm_recurrent_kernel, lstm_bias = layers['LSTM'].get_weights()
+    dense_kernel, dense_bias = layers['Dense'].get_weights()
+    return {'embedding': embedding, 'lstm_kernel': lstm_kernel, 'lstm_recurrent_kernel': lstm_recurrent_kernel,
+            'lstm_bias': lstm_bias, 'dense_kernel': dense_kernel, 'dense_bias': dense_bias,
+            'input_length': model.input_shape[1]}
+
+
+def export_numpy_weights(model, path='yt_model.npz'):
+    """
+    :param model: Trained Embedding -> SpatialDropout1D -> LSTM -> Dense Keras model
+    :param path: Output .npz path
+    """
+    np.savez(path, **_lstm_weights(model))
+
+
+def quantize_int8(weights, axis):
+    """
+    Symmetric per-channel int8 quantization: each channel is scaled so its
+    largest absolute weight maps to 127.
+
+    :param weights: float array
+    :param axis: Axis of the channels, each with its own scale
+    :return: tuple: int8 array, float32 scales broadcastable against it
+    """
+    reduced = tuple(dimension for dimension in range(weights.ndim) if dimension != axis)
+    scale = np.abs(weights).max(axis=reduced, keepdims=True) / 127
+    scale[scale == 0] = 1
+    return np.round(weights / scale).astype(np.int8), scale.astype(np.float32)
+
+
+def export_quantized_weights(model, path='yt_model_int8.npz'):
+    """
+    Post-training int8 quantization of the matrices (per embedding row, per
+    kernel output column); biases stay float32. Read by load_weights of the
+    numpy backend (SENTIMENT_BACKEND=int8).
+
+    :param model: Trained Embedding -> SpatialDropout1D -> LSTM -> Dense Keras model
+    :param path: Output .npz path
+    """
+    weights = _lstm_weights(model)
+    channel_axes = {'embedding': 0, 'lstm_kernel': 1, 'lstm_recurrent_kernel': 1, 'dense_kernel': 1}
+    for name, axis in channel_axes.items():
+        weights[name + '_int8'], weights[name + '_scale'] = quantize_int8(weights.pop(name), axis)
+    np.savez_compressed(path, **weights)
+
+
+def export_vocabulary(tokenizer, path='yt_vocab.json'):
+    """
+    :param tokenizer: Fitted Keras Tokenizer
+    :param path: Output .json path, see NumpyTokenizer
+    """
+    NumpyTokenizer.from_keras(tokenizer).save(path)
+
+
+def parity_texts(tokenizer, samples, seed):
+    """
+    :return: Random texts of known, rare & unknown words, mixed case, filtered
+        characters, non-ASCII text and sequences longer than any input length
+    """
+    words = list(tokenizer.word_index)[:(tokenizer.num_words or len(tokenizer.word_index)) * 2]
+    words += ['UNKNOWNWORD', 'Ça', 'İstanbul', 'straße', '日本語', '😀', 'e\u0301', "don't", '']
+    rnd = np.random.default_rng(seed)
+    separators = [' ', '  ', '_', '! ', '\t', '\n', '.', '-', '\u00a0', '\r']
+    texts = [''.join(word + rnd.choice(separators) for word in rnd.choice(words, size=rnd.integers(1, 30)))
+             for _ in range(samples)]
+    texts = [text.upper() if rnd.random() < 0.1 else text for text in texts]
+    texts += ['', ' ', '!!!', ' '.join(words[:500])]
+    return texts
+
+
+def check_equivalence(model, tokenizer, numpy_path='yt_model.npz', vocabulary_path='yt_vocab.json',
+                      samples=2000, seed=42):
+    """
+    Compare the exported vocabulary's token IDs & the numpy backend's
+    predictions against Keras.
+
+    :return: Largest absolute difference between the predicted probabilities
+    """
+    from keras.preprocessing.sequence import pad_sequences as keras_pad_sequences
+
+    numpy_model = NumpyLSTM.load(numpy_path)
+    start_time = time.perf_counter()
+    numpy_tokenizer = NumpyTokenizer.load(vocabulary_path)
+    print(f"Vocabulary loaded in {(time.perf_counter() - start_time) * 1000:.1f} ms")
+
+    texts = parity_texts(tokenizer, samples, seed)
+    sequences = tokenizer.texts_to_sequences(texts)
+    if sequences != numpy_tokenizer.texts_to_sequences(texts):
+        raise AssertionError("Tokenizer sequences differ from Keras")
+    input_length = model.input_shape[1]
+    padded = keras_pad_sequences(sequences, maxlen=input_length)
+    encoded, lengths = numpy_tokenizer.encode(texts, input_length)
+    if encoded.dtype != np.int32 or not np.array_equal(encoded, padded):
+        raise AssertionError("Encoded matrix differs from Keras pad_sequences")
+    if not np.array_equal(lengths, [min(len(sequence), input_length) for sequence in sequences]):
+        raise AssertionError("Encoded lengths differ from the Keras sequences")
+
+    difference = np.abs(model.predict(padded, verbose=0) - numpy_model.predict_encoded(encoded, lengths)).max()
+    if difference > 1e-4:
+        raise AssertionError(f"Predictions differ from Keras by {difference}")
+    return difference
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the model for the numpy backend.")
+    parser.add_argument('--check', action='store_true', help="Verify the export against Keras")
+    args = parser.parse_args()
+
+    from keras.models import load_model
+
+    model = load_model('yt_model.h5')
+    with open('tokenizer.pkl', 'rb') as handle:
+        tokenizer = pickle.load(handle)
+
+    export_numpy_weights(model)
+    export_quantized_weights(model)
+    export_vocabulary(tokenizer)
+    print("Exported yt_model.npz, yt_model_int8.npz & yt_vocab.json")
+    if args.check:
+        print("Max difference to Keras:", check_equivalence(model, tokenizer))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Compare the model variants the app can serve (SENTIMENT_BACKEND) on the
+held-out split written by train.py: accuracy, agreement with the Keras
+model, per-batch latency and file size. Variants whose files are missing
+are skipped. Writes a Markdown report.
+
+Run from ./train after train.py (which also calls it):
+
+    python model_report.py [--heldout heldout.csv] [--output model_report.md]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from app.model_registry import ARTIFACTS, LOADERS, get_model  # noqa: E402
+from app.sentiment_analyzer import BATCH_SIZE  # noqa: E402
+
+
+def predict_batches(model, padded, lengths, batch_size):
+    """
+    :return: tuple: class probabilities, seconds taken by each batch
+    """
+    probabilities, timings = [], []
+    for start in range(0, len(padded), batch_size):
+        batch, batch_lengths = padded[start:start + batch_size], lengths[start:start + batch_size]
+        start_time = time.perf_counter()
+        if hasattr(model, 'predict_encoded'):
+            probabilities.append(model.predict_encoded(batch, batch_lengths, batch_size=batch_size))
+        else:
+            probabilities.append(model.predict(batch, batch_size=batch_size, verbose=0))
+        timings.append(time.perf_counter() - start_time)
+    return np.concatenate(probabilities), timings
+
+
+def evaluate(texts, labels, batch_size=BATCH_SIZE, backends=None):
+    """
+    :param texts: Cleaned held-out texts
+    :param labels: Their class indices (sentiment + 1)
+    :param batch_size: Texts per inference batch
+    :param backends: Backends to evaluate, every one with its files present when None
+    :return: list of dicts, one per backend
+    """
+    backends = backends or [backend for backend in LOADERS
+                            if all(os.path.exists(path) for path in ARTIFACTS[backend])]
+    rows, reference = [], None
+    for backend in backends:
+        model, tokenizer = get_model(backend)
+        padded, lengths = tokenizer.encode(texts, model.input_shape[1])
+        # Warm-up batch, not timed
+        predict_batches(model, padded[:batch_size], lengths[:batch_size], batch_size)
+        probabilities, timings = predict_batches(model, padded, lengths, batch_size)
+        predicted = probabilities.argmax(axis=1)
+        # Agreement with the first backend evaluated, the Keras model when present
+        reference = predicted if reference is None else reference
+        rows.append({
+            'backend': backend,
+            'accuracy': float((predicted == labels).mean()),
+            'agreement': float((predicted == reference).mean()),
+            'batch_ms': float(np.median(timings) * 1000),
+            'texts_per_s': float(len(texts) / sum(timings)),
+            'size_mb': os.path.getsize(ARTIFACTS[backend][0]) / 2 ** 20,
+        })
+    return rows
+
+
+def write_report(rows, path, samples, batch_size=BATCH_SIZE):
+    """
+    :param rows: Results of evaluate
+    :return: Markdown of the report, also written to path
+    """
+    lines = [
+        "# Model variants",
+        "",
+        f"{samples} held-out texts, batches of {batch_size}, median latency per batch.",
+        f"Agreement is with the predictions of '{rows[0]['backend']}'.",
+        "",
+        "| backend | accuracy | agreement | ms / batch | texts / s | size (MB) |",
+        "|---|---:|---:|---:|---:|---:|",
+    ]
+    lines += [f"| {row['backend']} | {row['accuracy']:.2%} | {row['agreement']:.2%} | {row['batch_ms']:.1f} | "
+              f"{row['texts_per_s']:.0f} | {row['size_mb']:.2f} |" for row in rows]
+    with open(path, 'w') as handle:
+        handle.write('\n'.join(lines) + '\n')
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the accuracy, latency & size of the model variants.")
+    parser.add_argument('--heldout', default='heldout.csv', help="CSV of 'comment' & 'sentiment' written by train.py")
+    parser.add_argument('--output', default='model_report.md', help="Markdown report path")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Texts per inference batch")
+    parser.add_argument('--backends', nargs='+', choices=sorted(LOADERS), help="Backends to compare")
+    args = parser.parse_args()
+
+    heldout = pd.read_csv(args.heldout, encoding='ISO-8859-1', header=0).dropna(subset=['comment'])
+    texts = heldout['comment'].astype(str).tolist()
+    labels = heldout['sentiment'].to_numpy() + 1
+    rows = evaluate(texts, labels, args.batch_size, args.backends)
+    print(write_report(rows, args.output, len(texts), args.batch_size))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,57 +1,296 @@
+"""
+Train the LSTM sentiment model on data/dataset.csv (see data/classify_data.py)
+and export every variant the app serves.
+
+The dataset is never loaded whole: the vocabulary is fitted chunk by chunk,
+then each chunk is tokenized once into a cached shard (token IDs, lengths &
+labels, split into train & held-out rows). A tf.data pipeline streams the
+shards in shuffled batches, padded like the app pads them: at the start, to
+a maxlen taken from a percentile of the training lengths. Training stops
+early once the validation loss stops improving, and a crashed or
+interrupted run resumes from its last checkpoint when started again.
+
+Run from ./train:
+
+    python train.py [--maxlen-percentile 99] [--epochs 20] [--intra-op-threads 8]
+"""
+import argparse
+import json
+import os
 import pickle
+import shutil
+import sys
+import time
+from itertools import chain, count
 
+import numpy as np
 import pandas as pd
+import tensorflow as tf
+from keras.callbacks import BackupAndRestore, Callback, EarlyStopping
 from keras.layers import Embedding, LSTM, Dense, SpatialDropout1D
 from keras.models import Sequential
-from keras.preprocessing.sequence import pad_sequences
 from keras.preprocessing.text import Tokenizer
-from sklearn.model_selection import train_test_split
 
-# Load dataset: Dataset already cleaned-> ./data/classify_data.py
-data = pd.read_csv('data/dataset.csv', encoding='ISO-8859-1', header=0)
-# Remove rows where 'comment' is NaN
-data = data.dropna(subset=['comment'])
+from distill import distill, export_student_weights
+from export_model import export_numpy_weights, export_quantized_weights, export_vocabulary
+from model_report import evaluate, write_report
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from app.numpy_backend import NumpyTokenizer, pad_sequences  # noqa: E402
+
+# Bump when the shard layout changes, so stale caches are rebuilt
+SHARD_FORMAT = 1
+
+
+def read_chunks(path, chunk_size):
+    """
+    :return: generator of dataframes with the 'comment' & 'sentiment' columns
+    """
+    reader = pd.read_csv(path, encoding='ISO-8859-1', header=0, usecols=['comment', 'sentiment'],
+                         chunksize=chunk_size)
+    for chunk in reader:
+        # Remove rows where 'comment' is NaN
+        yield chunk.dropna(subset=['comment'])
+
+
+def heldout_mask(index, size, share, seed):
+    # Same split for a chunk on every run, without shuffling the whole dataset
+    return np.random.default_rng([seed, index]).random(size) < share
+
+
+def cache_key(args):
+    stat = os.stat(args.dataset)
+    return {'format': SHARD_FORMAT, 'dataset': os.path.abspath(args.dataset), 'size': stat.st_size,
+            'mtime': stat.st_mtime, 'chunk_size': args.chunk_size, 'num_words': args.num_words,
+            'heldout_share': args.heldout_share, 'seed': args.seed}
+
+
+def build_shards(args):
+    """
+    Fit the vocabulary on the training rows, then tokenize every chunk into
+    a train & a held-out shard. Reused as long as the dataset & settings match.
+
+    :return: Manifest dict: 'train' & 'heldout' shard paths & row counts
+    """
+    manifest_path = os.path.join(args.cache_dir, 'manifest.json')
+    key = cache_key(args)
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as handle:
+            manifest = json.load(handle)
+        if manifest['key'] == key:
+            print(f"Reusing {len(manifest['train'])} cached shards from {args.cache_dir}/")
+            return manifest
+    shutil.rmtree(args.cache_dir, ignore_errors=True)
+    os.makedirs(args.cache_dir)
+
+    start_time = time.time()
+    tokenizer = Tokenizer(num_words=args.num_words, split=' ')
+    for index, chunk in enumerate(read_chunks(args.dataset, args.chunk_size)):
+        mask = heldout_mask(index, len(chunk.index), args.heldout_share, args.seed)
+        tokenizer.fit_on_texts(chunk['comment'][~mask].astype(str).tolist())
+    with open(os.path.join(args.cache_dir, 'tokenizer.pkl'), 'wb') as handle:
+        pickle.dump(tokenizer, handle, protocol=pickle.HIGHEST_PROTOCOL)
+    print(f"Fitted the vocabulary in {time.time() - start_time:.0f}s")
+
+    # Same IDs as the Keras tokenizer (see export_model.py --check), several times faster
+    numpy_tokenizer = NumpyTokenizer.from_keras(tokenizer)
+    manifest = {'key': key, 'train': [], 'heldout': [], 'train_rows': 0, 'heldout_rows': 0}
+    heldout_texts = os.path.join(args.cache_dir, 'heldout.csv')
+    for index, chunk in enumerate(read_chunks(args.dataset, args.chunk_size)):
+        mask = heldout_mask(index, len(chunk.index), args.heldout_share, args.seed)
+        for split, rows in (('train', chunk[~mask]), ('heldout', chunk[mask])):
+            sequences = numpy_tokenizer.texts_to_sequences(rows['comment'].astype(str).tolist())
+            path = os.path.join(args.cache_dir, f'{split}_{index:05d}.npz')
+            np.savez(path, ids=np.fromiter(chain.from_iterable(sequences), dtype=np.int32),
+                     lengths=np.fromiter(map(len, sequences), dtype=np.int32, count=len(sequences)),
+                     labels=(rows['sentiment'].to_numpy() + 1).astype(np.int8))
+            manifest[split].append(path)
+            manifest[f'{split}_rows'] += len(sequences)
+        # Same encoding as the dataset is read with, so every text round-trips
+        chunk[mask].to_csv(heldout_texts, mode='a', header=index == 0, index=False, encoding='ISO-8859-1')
+    print(f"Tokenized {manifest['train_rows']} training & {manifest['heldout_rows']} held-out rows "
+          f"in {time.time() - start_time:.0f}s")
+
+    # Written last: a crash while building leaves no manifest, so the shards are rebuilt
+    with open(manifest_path + '.tmp', 'w') as handle:
+        json.dump(manifest, handle)
+    os.replace(manifest_path + '.tmp', manifest_path)
+    return manifest
+
+
+def load_shard(path):
+    with np.load(path) as shard:
+        ids, lengths, labels = shard['ids'], shard['lengths'], shard['labels']
+    return ids, np.concatenate([[0], np.cumsum(lengths)]), lengths, labels
+
+
+def percentile_maxlen(paths, percentile):
+    lengths = np.concatenate([load_shard(path)[2] for path in paths])
+    return max(1, int(np.ceil(np.percentile(lengths, percentile))))
+
+
+def iter_batches(paths, maxlen, batch_size, shuffle=False, seed=0):
+    """
+    Stream shards as batches of rows, in a random order of shards & rows
+    when shuffle is set. Batches are padded at the start to maxlen, as
+    served: the LSTM sees the same padding in training and in the app.
+
+    :return: generator of (int32 token IDs of shape (rows, maxlen), int32 labels)
+    """
+    rng = np.random.default_rng(seed)
+    paths = list(paths)
+    if shuffle:
+        rng.shuffle(paths)
+    for path in paths:
+        ids, offsets, lengths, labels = load_shard(path)
+        rows = rng.permutation(len(lengths)) if shuffle else np.arange(len(lengths))
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            padded = pad_sequences([ids[offsets[row]:offsets[row + 1]] for row in batch], maxlen)
+            yield padded, labels[batch].astype(np.int32)
+
+
+def make_dataset(paths, maxlen, batch_size, shuffle=False, seed=0):
+    """
+    :return: tf.data.Dataset of padded batches, reshuffled on each epoch when shuffle is set
+    """
+    epoch_seeds = count(seed)
+    dataset = tf.data.Dataset.from_generator(
+        lambda: iter_batches(paths, maxlen, batch_size, shuffle, next(epoch_seeds)),
+        output_signature=(tf.TensorSpec(shape=(None, maxlen), dtype=tf.int32),
+                          tf.TensorSpec(shape=(None,), dtype=tf.int32)))
+    return dataset.prefetch(tf.data.AUTOTUNE)
+
+
+def load_padded(paths, maxlen, limit, seed=0):
+    """
+    :return: int32 array of `limit` rows drawn at random from every shard
+        (all the rows when there are fewer), padded to maxlen
+    """
+    sizes = []
+    for path in paths:
+        with np.load(path) as shard:
+            sizes.append(len(shard['lengths']))
+    total = sum(sizes)
+    sample = np.sort(np.random.default_rng(seed).choice(total, size=min(limit, total), replace=False))
+    sequences, first = [], 0
+    for path, size in zip(paths, sizes):
+        rows = sample[(sample >= first) & (sample < first + size)] - first
+        first += size
+        if len(rows):
+            ids, offsets, _, _ = load_shard(path)
+            sequences += [ids[offsets[row]:offsets[row + 1]] for row in rows]
+    return pad_sequences(sequences, maxlen)
+
+
+def build_model(num_words, input_length):
+    model = Sequential()
+    model.add(Embedding(input_dim=num_words, output_dim=128, input_length=input_length))
+    model.add(SpatialDropout1D(0.2))
+    model.add(LSTM(100, dropout=0.2, recurrent_dropout=0.2))
+    model.add(Dense(3, activation='softmax'))
+    # Integer labels: no one-hot matrix of the dataset
+    model.compile(loss='sparse_categorical_crossentropy', optimizer='adam', metrics=['accuracy'])
+    return model
+
+
+class ThroughputLogger(Callback):
+
+    def __init__(self, samples):
+        super().__init__()
+        self.samples = samples
+        self.start_time = None
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.start_time = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        elapsed = time.perf_counter() - self.start_time
+        metrics = ', '.join(f"{name} {value:.4f}" for name, value in (logs or {}).items())
+        print(f"Epoch {epoch + 1}: {elapsed:.1f}s, {self.samples / elapsed:.0f} samples/s, {metrics}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the LSTM sentiment model.")
+    parser.add_argument('--dataset', default='data/dataset.csv', help="CSV of 'comment' & 'sentiment'")
+    parser.add_argument('--cache-dir', default='shards', help="Directory of the tokenized shards")
+    parser.add_argument('--chunk-size', type=int, default=100000, help="Rows per shard")
+    parser.add_argument('--num-words', type=int, default=5000, help="Vocabulary size")
+    parser.add_argument('--heldout-share', type=float, default=0.2, help="Share of rows held out")
+    parser.add_argument('--maxlen', type=int, help="Tokens kept per text, from --maxlen-percentile when unset")
+    parser.add_argument('--maxlen-percentile', type=float, default=99,
+                        help="Percentile of the training lengths used as maxlen")
+    parser.add_argument('--batch-size', type=int, default=64, help="Rows per batch")
+    parser.add_argument('--epochs', type=int, default=20, help="Most training epochs")
+    parser.add_argument('--patience', type=int, default=3, help="Epochs without improvement before stopping")
+    parser.add_argument('--checkpoint-dir', default='checkpoints', help="Directory of the resume checkpoints")
+    parser.add_argument('--checkpoint-steps', type=int, default=0,
+                        help="Batches between checkpoints, 0 to checkpoint every epoch")
+    parser.add_argument('--intra-op-threads', type=int, default=os.cpu_count(),
+                        help="Threads of a single op (matmul), 0 for the TensorFlow default")
+    parser.add_argument('--inter-op-threads', type=int, default=2,
+                        help="Ops run at the same time, 0 for the TensorFlow default")
+    parser.add_argument('--no-distill', action='store_true', help="Skip the distilled student")
+    parser.add_argument('--distill-samples', type=int, default=200000, help="Random rows the student is trained on")
+    parser.add_argument('--report-samples', type=int, default=20000, help="Held-out rows of the model report")
+    parser.add_argument('--seed', type=int, default=42, help="Seed of the split & shuffling")
+    args = parser.parse_args()
 
-print(data.head())
+    # Must be set before TensorFlow runs its first op
+    tf.config.threading.set_intra_op_parallelism_threads(args.intra_op_threads)
+    tf.config.threading.set_inter_op_parallelism_threads(args.inter_op_threads)
+    tf.random.set_seed(args.seed)
 
-# Tokenize text
-tokenizer = Tokenizer(num_words=5000, split=' ')
-tokenizer.fit_on_texts(data['comment'].values)
-X = tokenizer.texts_to_sequences(data['comment'].values)
-X = pad_sequences(X)
+    manifest = build_shards(args)
+    maxlen = args.maxlen or percentile_maxlen(manifest['train'], args.maxlen_percentile)
+    print(f"maxlen {maxlen}")
 
-y = pd.get_dummies(data['sentiment']).values
+    train_data = make_dataset(manifest['train'], maxlen, args.batch_size, shuffle=True, seed=args.seed)
+    heldout_data = make_dataset(manifest['heldout'], maxlen, args.batch_size)
 
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    model = build_model(args.num_words, maxlen)
+    start_time = time.time()
+    model.fit(
+        train_data,
+        epochs=args.epochs,
+        validation_data=heldout_data,
+        callbacks=[
+            # Restores the weights, optimizer & epoch of an interrupted run, deleted once training ends
+            BackupAndRestore(args.checkpoint_dir, save_freq=args.checkpoint_steps or 'epoch'),
+            EarlyStopping(monitor='val_loss', patience=args.patience, restore_best_weights=True),
+            ThroughputLogger(manifest['train_rows']),
+        ],
+        verbose=2,
+    )
+    print(f"Trained in {time.time() - start_time:.0f}s")
 
-# Build LSTM model
-model = Sequential()
-model.add(Embedding(input_dim=5000, output_dim=128, input_length=X.shape[1]))
-model.add(SpatialDropout1D(0.2))
-model.add(LSTM(100, dropout=0.2, recurrent_dropout=0.2))
-model.add(Dense(3, activation='softmax'))
+    score, acc = model.evaluate(heldout_data, verbose=2)
+    print("Test Score:", score)
+    print("Test Accuracy:", acc)
 
-model.compile(loss='categorical_crossentropy', optimizer='adam', metrics=['accuracy'])
+    # Save model & tokenizer
+    model.save('yt_model.h5')
+    shutil.copy(os.path.join(args.cache_dir, 'tokenizer.pkl'), 'tokenizer.pkl')
+    with open('tokenizer.pkl', 'rb') as handle:
+        tokenizer = pickle.load(handle)
 
-# Train the model
-batch_size = 64
-epochs = 20
+    # Export weights & vocabulary for the numpy inference backends
+    export_numpy_weights(model)
+    export_quantized_weights(model)
+    export_vocabulary(tokenizer)
 
-history = model.fit(
-    X_train, y_train,
-    epochs=epochs,
-    batch_size=batch_size,
-    validation_data=(X_test, y_test),
-    verbose=1
-)
+    # Optional distilled student for CPU-only nodes, trained on a sample of the rows
+    if not args.no_distill:
+        X_train = load_padded(manifest['train'], maxlen, args.distill_samples, args.seed)
+        X_val = load_padded(manifest['heldout'], maxlen, args.report_samples, args.seed)
+        export_student_weights(distill(model, X_train, X_val))
 
-score, acc = model.evaluate(X_test, y_test, verbose=2, batch_size=batch_size)
-print("Test Score:", score)
-print("Test Accuracy:", acc)
+    # Accuracy, latency & size of every variant on the held-out split
+    shutil.copy(os.path.join(args.cache_dir, 'heldout.csv'), 'heldout.csv')
+    heldout = next(read_chunks('heldout.csv', args.report_samples))
+    report = evaluate(heldout['comment'].astype(str).tolist(), heldout['sentiment'].to_numpy() + 1)
+    print(write_report(report, 'model_report.md', len(heldout.index)))
 
-# Save model
-model.save('yt_model.h5')
 
-# Save tokenizer
-with open('tokenizer.pkl', 'wb') as handle:
-    pickle.dump(tokenizer, handle, protocol=pickle.HIGHEST_PROTOCOL)
+if __name__ == '__main__':
+    main()